@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import FastAPI, Query
+from fastapi.responses import PlainTextResponse
+
+from kg_db import load_config
+from kg_frames import answer_frame, exclusion_pattern, to_frame
+from kg_metrics import SlowLog, in_context, question_trace, render_metrics, timed
+from kg_service import create_service
+from nlp_pipeline import load_pipeline
+from query_intent import parse_query
+
+config = load_config()
+
+app = FastAPI(title="Health Knowledge Hub API")
+
+slow_log = SlowLog(config.getint('metrics', 'slow_questions', fallback=0))
+
+# Each inference worker process loads its own copy of the pipeline
+_nlp = None
+
+
+def _init_nlp_worker():
+    global _nlp
+    _nlp = load_pipeline(load_config())
+
+
+def _parse(question):
+    return parse_query(_nlp(question))
+
+
+def group_by_source(frame, drop=()):
+    # same grouping the app does with groupby('Source'), as a list so a missing source stays representable
+    groups = {}
+    for row in frame.to_dict('records'):
+        items = groups.setdefault(row.get('Source'), [])
+        items.append({key: value for key, value in row.items() if key != 'Source' and key not in drop})
+    return [{'source': source, 'items': items} for source, items in groups.items()]
+
+
+def entity_json(name, answers, subject='', exclude=None):
+    # answers go through answer_frame, so they are filtered and renamed exactly as the app shows them
+    primary_answers = []
+    for search_type, rows in answers['primary_answer'].items():
+        frame = answer_frame(rows, 'primary_answer', search_type, exclude)
+        if not frame.empty:
+            primary_answers.append({'search_type': search_type, 'type': frame.columns[0],
+                                    'sources': group_by_source(frame, drop=['Name'])})
+    return {
+        'entity': name,
+        'definition': group_by_source(to_frame(answers['definition'], 'definition'), drop=['Name']),
+        'related': [row['Most_Similar'] for row in answers['similar'] or []],
+        'info': group_by_source(to_frame(answers['info'], 'info'), drop=['Name']),
+        'answers': primary_answers,
+        'secondary_answers': group_by_source(answer_frame(answers['secondary_answer'], 'secondary_answer', subject, exclude)),
+    }
+
+
+async def run_db(fn, *args):
+    # in_context so queries run on the pool are still attributed to the question's trace
+    return await asyncio.get_running_loop().run_in_executor(app.state.db_pool, functools.partial(in_context(fn), *args))
+
+
+@app.on_event('startup')
+async def startup():
+    app.state.db_pool = ThreadPoolExecutor(max_workers=config.getint('api', 'db_workers', fallback=32))
+    app.state.nlp_pool = ProcessPoolExecutor(max_workers=config.getint('api', 'nlp_workers', fallback=2),
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_nlp_worker)
+    app.state.exclude = exclusion_pattern(config)
+    app.state.service = create_service(config)
+    await run_db(app.state.service.prepare)
+
+
+@app.on_event('shutdown')
+async def shutdown():
+    app.state.nlp_pool.shutdown()
+    app.state.db_pool.shutdown()
+    app.state.service.close()
+
+
+@app.get('/ask')
+async def ask(q: str = Query(..., min_length=1)):
+    service = app.state.service
+    with question_trace(q, slow_log) as trace:
+        await run_db(service.check_version)
+        with timed('nlp'):
+            intent = await asyncio.get_running_loop().run_in_executor(app.state.nlp_pool, _parse, q)
+        trace.intent_types = intent.search_types
+        names = intent.lookup_names()
+        with timed('fetch'):
+            answers = await asyncio.gather(*[
+                run_db(service.fetch_entity, name, intent.search_types, intent.subject, intent.object) for name in names])
+        with timed('convert'):
+            return {'question': q, 'intent': intent.to_dict(),
+                    'entities': [entity_json(name, entity_answers, intent.subject, app.state.exclude) for name, entity_answers in zip(names, answers)]}
+
+
+@app.get('/entity/{name}')
+async def entity(name: str):
+    service = app.state.service
+    await run_db(service.check_version)
+    return entity_json(name, await run_db(service.fetch_entity, name), exclude=app.state.exclude)
+
+
+@app.get('/related/{name}')
+async def related(name: str):
+    service = app.state.service
+    await run_db(service.check_version)
+    name = service.resolve_name(name)
+    items = [row['Most_Similar'] for row in await run_db(service.similar, name) or []]
+    definitions, infos = await asyncio.gather(run_db(service.definition_batch, items), run_db(service.info_batch, items))
+    return {'entity': name,
+            'related': [{'name': item,
+                         'definition': group_by_source(to_frame(definitions.get(str(item)), 'definition'), drop=['Name']),
+                         'info': group_by_source(to_frame(infos.get(str(item)), 'info'), drop=['Name'])}
+                        for item in items]}
+
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    return render_metrics()
+
+
+# /slow shows question text and Cypher parameters, so it is only served when turned on
+if config.getboolean('api', 'slow_endpoint', fallback=False):
+    @app.get('/slow')
+    async def slow():
+        return slow_log.entries()
@@ -0,0 +1,45 @@
+import argparse
+import json
+import sys
+
+from kg_db import load_config
+from nlp_pipeline import load_pipeline
+from query_intent import parse_query
+
+
+def parse_queries(nlp, queries, batch_size=64, n_process=1):
+    # streams (query, QueryIntent) pairs; nlp.pipe keeps each query paired with its doc across processes
+    queries = (query for query in queries if query.strip() != '')
+    for doc, query in nlp.pipe(((query, query) for query in queries), as_tuples=True,
+                               batch_size=batch_size, n_process=n_process):
+        yield query, parse_query(doc)
+
+
+def write_jsonl(results, out):
+    count = 0
+    for query, intent in results:
+        out.write(json.dumps(dict(intent.to_dict(), query=query)) + '\n')
+        count += 1
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parse questions into intents and write them out as JSONL")
+    parser.add_argument('input', help="text file with one question per line, or - for stdin")
+    parser.add_argument('-o', '--output', default='-', help="JSONL output file, or - for stdout")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--n-process', type=int, default=1)
+    args = parser.parse_args()
+
+    nlp = load_pipeline(load_config())
+    source = sys.stdin if args.input == '-' else open(args.input)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        queries = (line.rstrip('\n') for line in source)
+        count = write_jsonl(parse_queries(nlp, queries, args.batch_size, args.n_process), out)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    print("Parsed", count, "queries", file=sys.stderr)
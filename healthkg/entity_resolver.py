@@ -0,0 +1,91 @@
+from array import array
+from collections import Counter
+
+from kg_db import read
+from kg_lookup import normalize_name
+
+# aliases may be stored as alias or aliases, as a string or a list of strings
+NODE_NAMES_QUERY = """
+                   match (n) where n.name is not null
+                   return n.name as name, coalesce(n.aliases, n.alias) as aliases
+                   """
+
+RELATIONSHIP_NAMES_QUERY = "match ()-[r]->() where r.name is not null return distinct r.name as name"
+
+
+def trigrams(key):
+    # padded so that short names and word starts still produce distinctive trigrams
+    padded = '  ' + key + ' '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def load_graph_names(driver):
+    # (name, canonical name) pairs for every node and relationship name and every node alias
+    names = []
+    for row in read(driver, NODE_NAMES_QUERY, name='entity_names'):
+        names.append((row['name'], row['name']))
+        names += [(str(alias), row['name']) for alias in _as_list(row['aliases'])]
+    names += [(row['name'], row['name']) for row in read(driver, RELATIONSHIP_NAMES_QUERY, name='entity_names')]
+    return names
+
+
+class EntityResolver:
+    """Maps free text to canonical graph names through a character-trigram index.
+
+    names is an iterable of (name, canonical name) pairs; aliases are passed with the
+    name they stand for, graph names with themselves.
+    """
+
+    def __init__(self, names):
+        self.keys = []
+        self.canonical = []
+        self.key_ids = {}
+        postings = {}
+        for name, canonical in names:
+            key = normalize_name(name)
+            if key == '' or key in self.key_ids:
+                continue
+            key_id = len(self.keys)
+            self.key_ids[key] = key_id
+            self.keys.append(key)
+            self.canonical.append(canonical)
+            for trigram in trigrams(key):
+                postings.setdefault(trigram, array('i')).append(key_id)
+        self.postings = postings
+        self.sizes = array('i', [len(trigrams(key)) for key in self.keys])
+
+    def resolve(self, text, limit=3, min_score=0.0):
+        # [(canonical name, score)] best first; score is the Dice coefficient of the trigram sets
+        key = normalize_name(text)
+        if key in self.key_ids:
+            return [(self.canonical[self.key_ids[key]], 1.0)]
+        query = trigrams(key)
+        if not query:
+            return []
+        shared = Counter()
+        for trigram in query:
+            shared.update(self.postings.get(trigram, ()))
+        # a Dice score of min_score needs at least this many shared trigrams with the shortest possible name
+        min_shared = min_score * len(query) / (2.0 - min_score) if min_score < 2 else len(query)
+        scored = {}
+        for key_id, count in shared.items():
+            if count < min_shared:
+                continue
+            score = 2.0 * count / (len(query) + self.sizes[key_id])
+            if score < min_score:
+                continue
+            canonical = self.canonical[key_id]
+            if score > scored.get(canonical, (0.0,))[0]:
+                scored[canonical] = (score, abs(len(self.keys[key_id]) - len(key)))
+        ranked = sorted(scored.items(), key=lambda item: (-item[1][0], item[1][1], item[0]))
+        return [(canonical, score) for canonical, (score, _) in ranked[:limit]]
+
+    def best(self, text, min_score=0.5):
+        matches = self.resolve(text, limit=1, min_score=min_score)
+        return matches[0][0] if matches else None
@@ -0,0 +1,109 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from kg_db import create_driver, load_config, read
+
+VERSION_QUERY = "match (v:GraphMeta) return max(v.version) as version"
+
+BUMP_VERSION_QUERY = """
+                     merge (v:GraphMeta)
+                     set v.version = coalesce(v.version, 0) + 1
+                     return v.version as version
+                     """
+
+
+def read_graph_version(driver):
+    rows = read(driver, VERSION_QUERY, name='graph_version')
+    return rows[0]['version'] if rows else None
+
+
+def bump_graph_version(driver):
+    # run by the ingest job after every re-ingest so that serving processes drop their caches
+    with driver.session() as session:
+        return session.run(BUMP_VERSION_QUERY).single()['version']
+
+
+class ResultCache:
+    """Process-wide LRU cache with a TTL, cleared whenever the graph version changes."""
+
+    def __init__(self, max_size=1024, ttl=3600, version_check_interval=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        # bumped by invalidate(), so a load that started before it is not stored after it
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._version_checked_at = None
+
+    def get_or_load(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = load()
+        if self.max_size > 0:
+            with self._lock:
+                if generation != self._generation:
+                    return value
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def check_version(self, load_version):
+        # True when the version changed and the cache was cleared, so callers can rebuild what depends on it
+        now = time.monotonic()
+        with self._lock:
+            if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_interval:
+                return False
+            self._version_checked_at = now
+        version = load_version()
+        if version == self.version:
+            return False
+        self.invalidate()
+        self.version = version
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'invalidations': self.invalidations, 'version': self.version}
+
+
+def create_cache(config):
+    return ResultCache(max_size=config.getint('cache', 'max_size', fallback=1024),
+                       ttl=config.getfloat('cache', 'ttl', fallback=3600),
+                       version_check_interval=config.getfloat('cache', 'version_check_interval', fallback=30))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] != 'bump':
+        print("usage: python kg_cache.py bump")
+        sys.exit(1)
+
+    driver = create_driver(load_config())
+    version = bump_graph_version(driver)
+    driver.close()
+    print("Graph version is now", version)
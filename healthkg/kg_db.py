@@ -0,0 +1,56 @@
+import configparser
+import time
+
+from neo4j import GraphDatabase
+
+from kg_metrics import record_query
+
+CONFIG_PATH = '../../healthhub.prop'
+
+# healthhub.prop [neo4j-pool] keys passed straight through to the driver
+POOL_SETTINGS = {
+    'max_connection_pool_size': int,
+    'connection_acquisition_timeout': float,
+    'max_connection_lifetime': float,
+    'max_transaction_retry_time': float,
+    'keep_alive': lambda value: value.lower() in ['true', 'yes', '1'],
+}
+
+
+def load_config(path=CONFIG_PATH):
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config
+
+
+def pool_settings(config):
+    settings = {}
+    if config.has_section('neo4j-pool'):
+        for key, convert in POOL_SETTINGS.items():
+            if config.has_option('neo4j-pool', key):
+                settings[key] = convert(config.get('neo4j-pool', key))
+    return settings
+
+
+def create_driver(config):
+    return GraphDatabase.driver("bolt://"+config['local-neo4j']['uri'],
+                                auth=(config['local-neo4j']['user'], config['local-neo4j']['password']),
+                                **pool_settings(config))
+
+
+def _fetch_all(tx, query, params):
+    # records must be materialized before the transaction function returns
+    result = tx.run(query, params)
+    records = [record.data() for record in result]
+    return records, result.consume()
+
+
+def read(driver, query, params=None, name='query'):
+    # read_transaction retries transient errors for up to max_transaction_retry_time
+    params = params or {}
+    start = time.perf_counter()
+    with driver.session() as session:
+        records, summary = session.read_transaction(_fetch_all, query, params)
+    record_query(name, query, params, time.perf_counter() - start,
+                 summary.result_available_after, summary.result_consumed_after)
+    return records
@@ -0,0 +1,100 @@
+import re
+
+import pandas as pd
+
+from kg_queries import ANSWER_COLUMN, LOOKUP_COLUMN, answer_column
+
+# Column order of each query's result, so empty results still carry their schema
+COLUMNS = {
+    'similar': ['Most_Similar', 'Name'],
+    'definition': ['Definition', 'Source', 'Name'],
+    'primary_answer': [ANSWER_COLUMN, 'Source', 'Notes', 'Name'],
+    'secondary_answer': ['Type', ANSWER_COLUMN, 'Source', 'Notes'],
+    'info': ['Info', 'Source', 'Name', 'Type'],
+}
+
+# Answers naming one of the hub's own topics are dropped from these answer types
+EXCLUDED_ANSWERS = ['COVID-19', 'Diabetes', 'High Blood Pressure', 'High Cholesterol', 'Stroke', 'Colorectal Cancer']
+FILTERED_COLUMNS = ['Effect', 'Instruction', 'Precaution']
+
+# Answer columns shown under a different header
+DISPLAY_COLUMNS = {
+    'Effect': 'Side Effect',
+    'Riskfactor': 'Risk Factor',
+}
+
+
+def to_frame(rows, query_name):
+    # object dtype keeps names that look numeric as the strings Neo4j returned
+    columns = COLUMNS[query_name]
+    return pd.DataFrame([[row.get(c) for c in columns] for row in rows or []], columns=columns, dtype=object)
+
+
+def batch_frame(grouped, query_name):
+    # one frame for a whole batch lookup, {name: rows} as returned by the *_batch methods, with its Lookup column
+    columns = [LOOKUP_COLUMN] + COLUMNS[query_name]
+    return pd.DataFrame([[row.get(c) for c in columns] for rows in grouped.values() for row in rows],
+                        columns=columns, dtype=object)
+
+
+def exclusion_pattern(config):
+    # [answers] exclude is a comma-separated list of names, matched anywhere in an answer
+    names = config.get('answers', 'exclude', fallback=','.join(EXCLUDED_ANSWERS)).split(',')
+    names = [name.strip() for name in names if name.strip() != '']
+    return re.compile('|'.join(re.escape(name) for name in names)) if names else None
+
+
+def answer_frame(rows, query_name, type, exclude=None):
+    # the answers of one type under their display header, with excluded answers filtered out
+    frame = to_frame(rows, query_name)
+    column = answer_column(type)
+    if exclude is not None and column in FILTERED_COLUMNS:
+        frame = frame[~frame[ANSWER_COLUMN].str.contains(exclude, na=False)]
+    return frame.rename(columns={ANSWER_COLUMN: DISPLAY_COLUMNS.get(column, column)})
+
+
+def source_tables(frame, drop=()):
+    # [(source, table)] per source; Notes is left out of a source that has none and blanks show as '-'
+    if frame.empty:
+        return []
+    has_notes = frame['Notes'].notna().groupby(frame['Source']).any() if 'Notes' in frame.columns else None
+    if has_notes is not None:
+        frame = frame.assign(Notes=frame['Notes'].fillna('-'))
+    tables = []
+    for source, group in frame.groupby('Source', sort=True):
+        columns = [c for c in drop if c in group.columns] + ['Source']
+        if has_notes is not None and not has_notes[source]:
+            columns.append('Notes')
+        tables.append((source, group.drop(columns=columns)))
+    return tables
+
+
+def lookup_tables(frame, drop=()):
+    # {lookup: [(source, table)]} of a batch frame, grouped by name and source in a single pass
+    tables = {}
+    if frame.empty:
+        return tables
+    columns = [LOOKUP_COLUMN, 'Source'] + [c for c in drop if c in frame.columns]
+    for (lookup, source), group in frame.groupby([LOOKUP_COLUMN, 'Source'], sort=True):
+        tables.setdefault(lookup, []).append((source, group.drop(columns=columns)))
+    return tables
+
+
+def primary_answer_view(rows, type, exclude=None):
+    # (entity name, answer header, [(source, table)]) ready to render, or None when nothing is left to show
+    frame = answer_frame(rows, 'primary_answer', type, exclude)
+    if frame.empty:
+        return None
+    name = frame['Name'].iloc[0]
+    header = str(frame.columns[0]).title()
+    if header == 'Risk Factor':
+        header = 'Risk Factor(s)'
+    else:
+        frame = frame.rename(columns={type.title(): type.title() + " for " + name})
+    return name, header, source_tables(frame, drop=['Name'])
+
+
+def secondary_answer_groups(rows, subject, exclude=None):
+    # {relationship type: [(source, table)]} of the answers for the subject
+    frame = answer_frame(rows, 'secondary_answer', subject, exclude)
+    return {type: source_tables(group, drop=['Type']) for type, group in frame.groupby('Type', sort=True)}
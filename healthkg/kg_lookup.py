@@ -0,0 +1,80 @@
+import re
+import sys
+
+from kg_db import create_driver, load_config
+
+LOOKUP_MODES = ['regex', 'normalized']
+
+ENTITY_LABEL = 'Entity'
+ENTITY_INDEX = 'entity_name_key'
+RELATIONSHIP_INDEX = 'relationship_name_key'
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def normalize_name(name):
+    # lower-cased and whitespace-collapsed, the form stored in name_key
+    return re.sub(r'\s+', ' ', str(name)).strip().lower()
+
+
+def fulltext_phrase(key):
+    # exact phrase for db.index.fulltext.queryRelationships, re-checked with name_key = $key
+    return '"' + key.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def get_relationship_types(session):
+    return [r['relationshipType'] for r in session.run("call db.relationshipTypes()")]
+
+
+def create_relationship_index(session):
+    rel_types = get_relationship_types(session)
+    if rel_types:
+        type_filter = '|'.join('`' + t.replace('`', '``') + '`' for t in rel_types)
+        session.run("create fulltext index " + RELATIONSHIP_INDEX + " if not exists for ()-[r:" + type_filter + "]-() on each [r.name_key]").consume()
+
+
+def ensure_lookup_indexes(driver):
+    with driver.session() as session:
+        session.run("create index " + ENTITY_INDEX + " if not exists for (n:" + ENTITY_LABEL + ") on (n.name_key)").consume()
+        create_relationship_index(session)
+
+
+def _write_keys(session, query, rows):
+    for i in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        session.run(query, rows=rows[i:i + BACKFILL_BATCH_SIZE]).consume()
+
+
+def backfill(driver):
+    with driver.session() as session:
+        nodes = [{'id': r['id'], 'key': normalize_name(r['name'])}
+                 for r in session.run("match (n) where n.name is not null return id(n) as id, n.name as name")]
+        _write_keys(session, """
+                    unwind $rows as row
+                    match (n) where id(n) = row.id
+                    set n.name_key = row.key, n:""" + ENTITY_LABEL, nodes)
+
+        relationships = [{'id': r['id'], 'key': normalize_name(r['name'])}
+                         for r in session.run("match ()-[r]->() where r.name is not null return id(r) as id, r.name as name")]
+        _write_keys(session, """
+                    unwind $rows as row
+                    match ()-[r]->() where id(r) = row.id
+                    set r.name_key = row.key
+                    """, relationships)
+
+        # relationship types may have changed since the full-text index was created
+        session.run("drop index " + RELATIONSHIP_INDEX + " if exists").consume()
+    ensure_lookup_indexes(driver)
+    with driver.session() as session:
+        session.run("call db.awaitIndexes()").consume()
+    return len(nodes), len(relationships)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] != 'backfill':
+        print("usage: python kg_lookup.py backfill")
+        sys.exit(1)
+
+    driver = create_driver(load_config())
+    node_count, relationship_count = backfill(driver)
+    driver.close()
+    print("Backfilled name_key on", node_count, "nodes and", relationship_count, "relationships")
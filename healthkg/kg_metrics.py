@@ -0,0 +1,257 @@
+import contextvars
+import heapq
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from query_intent import NOUN_INTENTS, VERB_INTENTS
+
+# Upper bounds in seconds, from a cached lookup to a slow cold question
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stages of a question; render is whatever the script run spends outside the others
+STAGES = ['nlp', 'fetch', 'convert', 'render']
+
+# Intent labels of the question histogram; an unmapped lemma is its own search type, so it counts as other
+INTENT_LABELS = set(NOUN_INTENTS.values()) | set(VERB_INTENTS.values())
+
+
+class Histogram:
+    """A labelled histogram rendered in the Prometheus text exposition format."""
+
+    def __init__(self, name, help, label_name, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_name = label_name
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = ['# HELP ' + self.name + ' ' + self.help, '# TYPE ' + self.name + ' histogram']
+        with self._lock:
+            series = sorted((label, counts[:], count, total) for label, (counts, count, total) in self._series.items())
+        for label, counts, count, total in series:
+            labels = self.label_name + '="' + _escape(label) + '"'
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(self.name + '_bucket{' + labels + ',le="' + repr(bound) + '"} ' + str(bucket_count))
+            lines.append(self.name + '_bucket{' + labels + ',le="+Inf"} ' + str(count))
+            lines.append(self.name + '_sum{' + labels + '} ' + repr(total))
+            lines.append(self.name + '_count{' + labels + '} ' + str(count))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(label):
+    return str(label).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+STAGE_SECONDS = Histogram('healthkg_stage_seconds', "Time spent in each stage of a question.", 'stage')
+LOOKUP_SECONDS = Histogram('healthkg_lookup_seconds', "Time to load a lookup on a cache miss, per query function.", 'lookup')
+QUERY_SECONDS = Histogram('healthkg_query_seconds', "Client time of each Cypher query, per query function.", 'query')
+QUERY_AVAILABLE_SECONDS = Histogram('healthkg_query_available_seconds', "Server time until the first record was available, per query function.", 'query')
+QUERY_CONSUMED_SECONDS = Histogram('healthkg_query_consumed_seconds', "Server time until all records were consumed, per query function.", 'query')
+QUESTION_SECONDS = Histogram('healthkg_question_seconds', "Time to answer a question, per intent type.", 'intent')
+
+HISTOGRAMS = [STAGE_SECONDS, LOOKUP_SECONDS, QUERY_SECONDS, QUERY_AVAILABLE_SECONDS, QUERY_CONSUMED_SECONDS, QUESTION_SECONDS]
+
+# ResultCache.stats() keys exported per registered cache, with their Prometheus type and help text
+CACHE_METRICS = [
+    ('hits', 'counter', "Requests answered from the cache."),
+    ('misses', 'counter', "Requests that had to be loaded."),
+    ('evictions', 'counter', "Entries dropped to stay within max_size."),
+    ('invalidations', 'counter', "Times the cache was cleared for a new graph version."),
+    ('size', 'gauge', "Entries currently cached."),
+]
+
+_caches = {}
+
+
+def register_cache(name, cache):
+    # cache is anything with a stats() dict holding the CACHE_METRICS keys, such as a ResultCache
+    _caches[name] = cache
+
+
+def render_cache_metrics():
+    stats = sorted((name, cache.stats()) for name, cache in list(_caches.items()))
+    lines = []
+    for key, metric_type, help in CACHE_METRICS:
+        name = 'healthkg_cache_' + key + ('_total' if metric_type == 'counter' else '')
+        lines += ['# HELP ' + name + ' ' + help, '# TYPE ' + name + ' ' + metric_type]
+        lines += [name + '{cache="' + _escape(cache) + '"} ' + str(values[key]) for cache, values in stats]
+    return '\n'.join(lines) + '\n'
+
+
+def render_metrics():
+    return ''.join(histogram.render() for histogram in HISTOGRAMS) + render_cache_metrics()
+
+
+class Trace:
+    """Per-stage timings and the Cypher queries of one question."""
+
+    def __init__(self, question):
+        self.question = question
+        self.intent_types = ()
+        self.stages = {}
+        self.queries = []
+        self.total = None
+        self._lock = threading.Lock()
+        self._token = None
+        self._start = None
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_query(self, name, text, params, seconds, available, consumed):
+        with self._lock:
+            self.queries.append({'query': name, 'cypher': text, 'params': params, 'ms': seconds * 1000,
+                                 'available_ms': available, 'consumed_ms': consumed})
+
+    def breakdown(self):
+        # [(stage, ms)] in pipeline order, with render taking up the rest of the total
+        stages = dict(self.stages)
+        if self.total is not None:
+            stages['render'] = max(0.0, self.total - sum(seconds for stage, seconds in stages.items() if stage != 'render'))
+        return [(stage, stages[stage] * 1000) for stage in STAGES if stage in stages]
+
+    def to_dict(self):
+        return {'question': self.question, 'intent_types': list(self.intent_types),
+                'total_ms': self.total * 1000 if self.total is not None else None,
+                'stages': dict(self.breakdown()), 'queries': list(self.queries)}
+
+
+class SlowLog:
+    """The slowest questions seen so far, kept as traces."""
+
+    def __init__(self, size):
+        self.size = size
+        self._heap = []
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, trace):
+        if self.size <= 0:
+            return
+        with self._lock:
+            # the counter breaks ties so traces are never compared
+            self._count += 1
+            entry = (trace.total, self._count, trace)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, entry)
+            elif trace.total > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def entries(self):
+        with self._lock:
+            return [trace.to_dict() for _, _, trace in sorted(self._heap, key=lambda entry: -entry[0])]
+
+
+_trace = contextvars.ContextVar('healthkg_trace', default=None)
+
+
+def current_trace():
+    return _trace.get()
+
+
+def start_trace(question):
+    # every timer and query until finish_trace is attributed to this question
+    trace = Trace(question)
+    trace._token = _trace.set(trace)
+    trace._start = time.perf_counter()
+    return trace
+
+
+def finish_trace(trace, slow_log=None):
+    trace.total = time.perf_counter() - trace._start
+    _trace.reset(trace._token)
+    STAGE_SECONDS.observe('render', dict(trace.breakdown()).get('render', 0.0) / 1000)
+    for intent_type in trace.intent_types or ['none']:
+        QUESTION_SECONDS.observe(intent_type if intent_type in INTENT_LABELS else 'other', trace.total)
+    if slow_log is not None:
+        slow_log.record(trace)
+    return trace
+
+
+@contextmanager
+def question_trace(question, slow_log=None):
+    trace = start_trace(question)
+    try:
+        yield trace
+    finally:
+        finish_trace(trace, slow_log)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(stage, seconds)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add_stage(stage, seconds)
+
+
+def timed_call(stage, fn, *args):
+    with timed(stage):
+        return fn(*args)
+
+
+def record_query(name, text, params, seconds, available, consumed):
+    # available and consumed are the driver's result_available_after and result_consumed_after, in ms
+    QUERY_SECONDS.observe(name, seconds)
+    if available is not None:
+        QUERY_AVAILABLE_SECONDS.observe(name, available / 1000)
+    if consumed is not None:
+        QUERY_CONSUMED_SECONDS.observe(name, consumed / 1000)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_query(name, text, params, seconds, available, consumed)
+
+
+def in_context(fn):
+    # threads from an executor do not inherit the caller's trace, so carry it over explicitly
+    context = contextvars.copy_context()
+    return lambda *args: context.run(fn, *args)
+
+
+def serve_metrics(port, slow_log=None, host='127.0.0.1'):
+    # /metrics in the Prometheus text format and /slow as JSON, from a daemon thread;
+    # /slow exposes questions and query parameters, so it stays on localhost unless host says otherwise
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = render_metrics().encode('utf-8'), 'text/plain; version=0.0.4'
+            elif self.path == '/slow':
+                body, content_type = json.dumps(slow_log.entries() if slow_log is not None else []).encode('utf-8'), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,306 @@
+import re
+
+from kg_db import read
+from kg_lookup import ENTITY_LABEL, RELATIONSHIP_INDEX, fulltext_phrase, normalize_name
+
+# Fixed query texts per lookup mode. User text only ever travels as a parameter so
+# Neo4j can reuse one cached plan per query.
+QUERIES = {
+    'regex': {
+        'similar': """
+                   match (n)-[:related_to]-(x)
+                   where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Medication') and n.name =~ $pattern and n.text <> ""
+                   return distinct x.name as Most_Similar, n.name as Name
+                   """,
+        'definition': """
+                      match (n)
+                      where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Vaccination' or n.type = 'Medication') and n.name =~ $pattern and n.text <> ""
+                      return distinct n.text as Definition, n.source as Source, n.name as Name
+                      """,
+        'primary_answer': """
+                          match (n)-[r]-(x)
+                          where n.type = $type and r.name =~ $pattern and not x.name =~ $pattern
+                          return distinct x.name as Answer, r.source as Source, r.text as Notes, r.name as Name
+                          """,
+        'secondary_answer': """
+                            match (x)-[r1]-(n)-[r2]-(y)
+                            where n.type = $subject and n.name =~ $pattern and x.type = $object and y.type <> $object
+                            return distinct r2.name as Type, y.name as Answer, r2.source as Source, r2.text as Notes
+                            """,
+        'info': """
+                match (n:Info)-[r]-(x)
+                where r.name =~ $pattern
+                return distinct r.text as Info, r.source as Source, r.name as Name, r.type as Type
+                """,
+        'similar_batch': """
+                         unwind $lookups as lookup
+                         match (n)-[:related_to]-(x)
+                         where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Medication') and n.name =~ lookup.pattern and n.text <> ""
+                         return distinct lookup.name as Lookup, x.name as Most_Similar, n.name as Name
+                         """,
+        'definition_batch': """
+                            unwind $lookups as lookup
+                            match (n)
+                            where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Vaccination' or n.type = 'Medication') and n.name =~ lookup.pattern and n.text <> ""
+                            return distinct lookup.name as Lookup, n.text as Definition, n.source as Source, n.name as Name
+                            """,
+        'info_batch': """
+                      unwind $lookups as lookup
+                      match (n:Info)-[r]-(x)
+                      where r.name =~ lookup.pattern
+                      return distinct lookup.name as Lookup, r.text as Info, r.source as Source, r.name as Name, r.type as Type
+                      """,
+        'bundle': """
+                  call {
+                      match (n)
+                      where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Vaccination' or n.type = 'Medication') and n.name =~ $pattern and n.text <> ""
+                      return collect(distinct {Definition: n.text, Source: n.source, Name: n.name}) as definition
+                  }
+                  call {
+                      match (n)-[:related_to]-(x)
+                      where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Medication') and n.name =~ $pattern and n.text <> ""
+                      return collect(distinct {Most_Similar: x.name, Name: n.name}) as similar
+                  }
+                  call {
+                      match (n:Info)-[r]-(x)
+                      where r.name =~ $pattern
+                      return collect(distinct {Info: r.text, Source: r.source, Name: r.name, Type: r.type}) as info
+                  }
+                  call {
+                      match (n)-[r]-(x)
+                      where n.type in $types and r.name =~ $pattern and not x.name =~ $pattern
+                      return collect(distinct {NodeType: n.type, Answer: x.name, Source: r.source, Notes: r.text, Name: r.name}) as primary_answer
+                  }
+                  call {
+                      match (x)-[r1]-(n)-[r2]-(y)
+                      where n.type = $subject and n.name =~ $pattern and x.type = $object and y.type <> $object
+                      return collect(distinct {Type: r2.name, Answer: y.name, Source: r2.source, Notes: r2.text}) as secondary_answer
+                  }
+                  return definition, similar, info, primary_answer, secondary_answer
+                  """,
+    },
+    'normalized': {
+        'similar': """
+                   match (n:""" + ENTITY_LABEL + """ {name_key: $key})-[:related_to]-(x)
+                   where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Medication') and n.text <> ""
+                   return distinct x.name as Most_Similar, n.name as Name
+                   """,
+        'definition': """
+                      match (n:""" + ENTITY_LABEL + """ {name_key: $key})
+                      where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Vaccination' or n.type = 'Medication') and n.text <> ""
+                      return distinct n.text as Definition, n.source as Source, n.name as Name
+                      """,
+        'primary_answer': """
+                          call db.index.fulltext.queryRelationships('""" + RELATIONSHIP_INDEX + """', $phrase) yield relationship as r
+                          where r.name_key = $key
+                          match (n)-[r]-(x)
+                          where n.type = $type and coalesce(x.name_key, '') <> $key
+                          return distinct x.name as Answer, r.source as Source, r.text as Notes, r.name as Name
+                          """,
+        'secondary_answer': """
+                            match (x)-[r1]-(n:""" + ENTITY_LABEL + """ {name_key: $key})-[r2]-(y)
+                            where n.type = $subject and x.type = $object and y.type <> $object
+                            return distinct r2.name as Type, y.name as Answer, r2.source as Source, r2.text as Notes
+                            """,
+        'info': """
+                call db.index.fulltext.queryRelationships('""" + RELATIONSHIP_INDEX + """', $phrase) yield relationship as r
+                where r.name_key = $key
+                match (n:Info)-[r]-(x)
+                return distinct r.text as Info, r.source as Source, r.name as Name, r.type as Type
+                """,
+        'similar_batch': """
+                         unwind $lookups as lookup
+                         match (n:""" + ENTITY_LABEL + """ {name_key: lookup.key})-[:related_to]-(x)
+                         where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Medication') and n.text <> ""
+                         return distinct lookup.name as Lookup, x.name as Most_Similar, n.name as Name
+                         """,
+        'definition_batch': """
+                            unwind $lookups as lookup
+                            match (n:""" + ENTITY_LABEL + """ {name_key: lookup.key})
+                            where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Vaccination' or n.type = 'Medication') and n.text <> ""
+                            return distinct lookup.name as Lookup, n.text as Definition, n.source as Source, n.name as Name
+                            """,
+        'info_batch': """
+                      unwind $lookups as lookup
+                      call db.index.fulltext.queryRelationships('""" + RELATIONSHIP_INDEX + """', lookup.phrase) yield relationship as r
+                      where r.name_key = lookup.key
+                      match (n:Info)-[r]-(x)
+                      return distinct lookup.name as Lookup, r.text as Info, r.source as Source, r.name as Name, r.type as Type
+                      """,
+        'bundle': """
+                  call {
+                      match (n:""" + ENTITY_LABEL + """ {name_key: $key})
+                      where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Vaccination' or n.type = 'Medication') and n.text <> ""
+                      return collect(distinct {Definition: n.text, Source: n.source, Name: n.name}) as definition
+                  }
+                  call {
+                      match (n:""" + ENTITY_LABEL + """ {name_key: $key})-[:related_to]-(x)
+                      where (n.type = 'Disease' or n.type = 'Condition' or n.type = 'Medication') and n.text <> ""
+                      return collect(distinct {Most_Similar: x.name, Name: n.name}) as similar
+                  }
+                  call {
+                      call db.index.fulltext.queryRelationships('""" + RELATIONSHIP_INDEX + """', $phrase) yield relationship as r
+                      with r where r.name_key = $key
+                      match (n:Info)-[r]-(x)
+                      return collect(distinct {Info: r.text, Source: r.source, Name: r.name, Type: r.type}) as info
+                  }
+                  call {
+                      call db.index.fulltext.queryRelationships('""" + RELATIONSHIP_INDEX + """', $phrase) yield relationship as r
+                      with r where r.name_key = $key
+                      match (n)-[r]-(x)
+                      where n.type in $types and coalesce(x.name_key, '') <> $key
+                      return collect(distinct {NodeType: n.type, Answer: x.name, Source: r.source, Notes: r.text, Name: r.name}) as primary_answer
+                  }
+                  call {
+                      match (x)-[r1]-(n:""" + ENTITY_LABEL + """ {name_key: $key})-[r2]-(y)
+                      where n.type = $subject and x.type = $object and y.type <> $object
+                      return collect(distinct {Type: r2.name, Answer: y.name, Source: r2.source, Notes: r2.text}) as secondary_answer
+                  }
+                  return definition, similar, info, primary_answer, secondary_answer
+                  """,
+    },
+}
+
+# bundle fetches everything about an entity in one query, separate runs one query per lookup
+# and concurrent runs those per-lookup queries in parallel
+FETCH_STRATEGIES = ['bundle', 'separate', 'concurrent']
+
+# Batched queries tag every row with the name it was looked up by.
+LOOKUP_COLUMN = 'Lookup'
+
+# The bundle query tags primary answers with the node type they were found under.
+NODE_TYPE_COLUMN = 'NodeType'
+
+# Answers are returned under a fixed alias; the app renames it to the requested type.
+ANSWER_COLUMN = 'Answer'
+
+TYPES_QUERY = "match (n) where n.type is not null return distinct n.type as type"
+
+
+def load_type_whitelist(driver):
+    # node types present in the graph, keyed by lower-case for case-insensitive resolution
+    return {r['type'].lower(): r['type'] for r in read(driver, TYPES_QUERY, name='types')}
+
+
+def resolve_type(type, type_whitelist):
+    return type_whitelist.get(type.replace('-', '').lower())
+
+
+def answer_column(type):
+    return type.title().replace('-', '')
+
+
+def entity_params(entity):
+    key = normalize_name(entity)
+    return {'pattern': '(?i)' + re.escape(entity), 'key': key, 'phrase': fulltext_phrase(key)}
+
+
+def similar_query(entity, mode):
+    if entity != '':
+        return QUERIES[mode]['similar'], entity_params(entity)
+
+
+def definition_query(entity, mode):
+    if entity != '':
+        return QUERIES[mode]['definition'], entity_params(entity)
+
+
+def primary_answer_query(entity, type, mode, type_whitelist):
+    node_type = resolve_type(type, type_whitelist)
+    if entity != '' and node_type is not None and node_type.lower() != entity.lower():
+        params = entity_params(entity)
+        params['type'] = node_type
+        return QUERIES[mode]['primary_answer'], params
+
+
+def secondary_answer_query(entity, subject, object, mode, type_whitelist):
+    subject_type = resolve_type(subject, type_whitelist)
+    object_type = resolve_type(object, type_whitelist)
+    if entity != '' and subject_type is not None and object_type is not None:
+        params = entity_params(entity)
+        params['subject'] = subject_type
+        params['object'] = object_type
+        return QUERIES[mode]['secondary_answer'], params
+
+
+def info_query(entity, mode):
+    if entity != '':
+        return QUERIES[mode]['info'], entity_params(entity)
+
+
+def batch_params(names):
+    names = dict.fromkeys(str(name) for name in names if name != '')
+    return {'lookups': [dict(entity_params(name), name=name) for name in names]}
+
+
+def similar_batch_query(names, mode):
+    params = batch_params(names)
+    if params['lookups']:
+        return QUERIES[mode]['similar_batch'], params
+
+
+def definition_batch_query(names, mode):
+    params = batch_params(names)
+    if params['lookups']:
+        return QUERIES[mode]['definition_batch'], params
+
+
+def info_batch_query(names, mode):
+    params = batch_params(names)
+    if params['lookups']:
+        return QUERIES[mode]['info_batch'], params
+
+
+def group_by_lookup(rows):
+    # rows keep their Lookup column, so a batch can be turned back into one frame
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row[LOOKUP_COLUMN], []).append(row)
+    return grouped
+
+
+def bundle_query(entity, search_types, subject, object, mode, type_whitelist):
+    # one round trip for everything the app shows about an entity
+    if entity == '':
+        return None
+    params = entity_params(entity)
+    params['types'] = list(dict.fromkeys(
+        node_type for node_type in (resolve_type(search_type, type_whitelist) for search_type in search_types)
+        if node_type is not None and node_type.lower() != entity.lower()))
+    params['subject'] = resolve_type(subject, type_whitelist) if subject != '' else None
+    params['object'] = resolve_type(object, type_whitelist) if object != '' else None
+    return QUERIES[mode]['bundle'], params
+
+
+def split_bundle(row, entity, search_types, subject, object, type_whitelist):
+    # shapes a bundle row like the individual lookups, None where that lookup would not have run
+    if row is None:
+        return {'similar': None, 'definition': None, 'info': None,
+                'primary_answer': dict.fromkeys(search_types), 'secondary_answer': None}
+    answers_by_type = {}
+    for answer in row['primary_answer']:
+        answer = dict(answer)
+        answers_by_type.setdefault(answer.pop(NODE_TYPE_COLUMN), []).append(answer)
+
+    primary_answers = {}
+    for search_type in search_types:
+        node_type = resolve_type(search_type, type_whitelist)
+        if node_type is not None and node_type.lower() != entity.lower():
+            primary_answers[search_type] = answers_by_type.get(node_type, [])
+        else:
+            primary_answers[search_type] = None
+
+    secondary_answer = None
+    if resolve_type(subject, type_whitelist) is not None and resolve_type(object, type_whitelist) is not None:
+        secondary_answer = row['secondary_answer']
+
+    return {'similar': row['similar'], 'definition': row['definition'], 'info': row['info'],
+            'primary_answer': primary_answers, 'secondary_answer': secondary_answer}
+
+
+def warm_up(driver, mode):
+    # EXPLAIN plans each query and fills Neo4j's plan cache without executing it
+    params = entity_params('')
+    params.update({'type': '', 'types': [], 'subject': '', 'object': '', 'lookups': []})
+    for query in QUERIES[mode].values():
+        read(driver, "explain " + query, params, name='warm_up')
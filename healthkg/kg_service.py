@@ -0,0 +1,220 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from entity_resolver import EntityResolver, load_graph_names
+from kg_cache import create_cache, read_graph_version
+from kg_db import create_driver, read
+from kg_lookup import LOOKUP_MODES, ensure_lookup_indexes, normalize_name
+from kg_metrics import LOOKUP_SECONDS, in_context, register_cache
+from kg_queries import FETCH_STRATEGIES, LOOKUP_COLUMN, bundle_query, definition_batch_query, definition_query, group_by_lookup, info_batch_query, info_query, load_type_whitelist, primary_answer_query, secondary_answer_query, similar_batch_query, similar_query, split_bundle, warm_up
+
+BACKENDS = ['neo4j', 'snapshot']
+
+
+class KnowledgeService:
+    """The Health KG lookups shared by the Streamlit app and the HTTP API.
+
+    Backends implement the five lookups as _similar, _definition, _primary_answer,
+    _secondary_answer and _info, and list their names for the entity resolver as
+    _entity_names; caching, fetch strategies and name resolution live here.
+    """
+
+    def __init__(self, cache, fetch_strategy='bundle', max_concurrency=8, resolver_min_score=None):
+        if fetch_strategy not in FETCH_STRATEGIES:
+            raise ValueError("Unknown fetch strategy '" + fetch_strategy + "', expected one of " + ", ".join(FETCH_STRATEGIES))
+        self.cache = cache
+        self.fetch_strategy = fetch_strategy
+        self.type_whitelist = {}
+        # None leaves entity text as parsed; otherwise names are resolved once prepare() has built the resolver
+        self.resolver_min_score = resolver_min_score
+        self.resolver = None
+        # shared by all questions, so it also bounds the concurrent lookups across sessions
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency) if fetch_strategy == 'concurrent' else None
+
+    def prepare(self):
+        if self.resolver_min_score is not None:
+            self.resolver = EntityResolver(self._entity_names())
+
+    def check_version(self):
+        pass
+
+    def _entity_names(self):
+        return []
+
+    def resolve_name(self, name):
+        # the best-scoring canonical graph name, or the name itself when nothing scores high enough
+        if self.resolver is None or name == '':
+            return name
+        return self.resolver.best(name, self.resolver_min_score) or name
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def _timed(self, lookup, load, *args):
+        # only cache misses are timed, so the histogram shows what the backend costs
+        start = time.perf_counter()
+        try:
+            return load(*args)
+        finally:
+            LOOKUP_SECONDS.observe(lookup, time.perf_counter() - start)
+
+    def similar(self, entity):
+        return self.cache.get_or_load(('similar', normalize_name(entity)), lambda: self._timed('similar', self._similar, entity))
+
+    def definition(self, entity):
+        return self.cache.get_or_load(('definition', normalize_name(entity)), lambda: self._timed('definition', self._definition, entity))
+
+    def primary_answer(self, entity, type):
+        return self.cache.get_or_load(('primary_answer', normalize_name(entity), type.lower()),
+                                      lambda: self._timed('primary_answer', self._primary_answer, entity, type))
+
+    def secondary_answer(self, entity, subject, object):
+        return self.cache.get_or_load(('secondary_answer', normalize_name(entity), subject.lower(), object.lower()),
+                                      lambda: self._timed('secondary_answer', self._secondary_answer, entity, subject, object))
+
+    def info(self, entity):
+        return self.cache.get_or_load(('info', normalize_name(entity)), lambda: self._timed('info', self._info, entity))
+
+    def bundle(self, entity, search_types, subject, object):
+        return self.separate(entity, search_types, subject, object)
+
+    def separate(self, entity, search_types, subject, object):
+        return {'similar': self.similar(entity), 'definition': self.definition(entity), 'info': self.info(entity),
+                'primary_answer': {search_type: self.primary_answer(entity, search_type) for search_type in search_types},
+                'secondary_answer': self.secondary_answer(entity, subject, object) if subject != "" and object != "" else None}
+
+    def concurrent(self, entity, search_types, subject, object):
+        # the lookups are independent, so latency is that of the slowest one rather than their sum
+        def submit(lookup, *args):
+            return self.executor.submit(in_context(lookup), *args)
+        similar = submit(self.similar, entity)
+        definition = submit(self.definition, entity)
+        info = submit(self.info, entity)
+        primary_answers = {search_type: submit(self.primary_answer, entity, search_type) for search_type in search_types}
+        secondary_answer = submit(self.secondary_answer, entity, subject, object) if subject != "" and object != "" else None
+        return {'similar': similar.result(), 'definition': definition.result(), 'info': info.result(),
+                'primary_answer': {search_type: future.result() for search_type, future in primary_answers.items()},
+                'secondary_answer': secondary_answer.result() if secondary_answer is not None else None}
+
+    def fetch_entity(self, entity, search_types=(), subject='', object=''):
+        entity = self.resolve_name(entity)
+        if self.fetch_strategy == 'bundle':
+            return self.bundle(entity, search_types, subject, object)
+        if self.fetch_strategy == 'concurrent':
+            return self.concurrent(entity, search_types, subject, object)
+        return self.separate(entity, search_types, subject, object)
+
+    def _lookup_batch(self, lookup, names):
+        grouped = {}
+        for name in dict.fromkeys(str(name) for name in names if name != ''):
+            rows = lookup(name)
+            if rows:
+                # the same shape as group_by_lookup; cached rows are copied, not tagged in place
+                grouped[name] = [dict(row, **{LOOKUP_COLUMN: name}) for row in rows]
+        return grouped
+
+    def similar_batch(self, names):
+        return self._lookup_batch(self.similar, names)
+
+    def definition_batch(self, names):
+        return self._lookup_batch(self.definition, names)
+
+    def info_batch(self, names):
+        return self._lookup_batch(self.info, names)
+
+
+class Neo4jService(KnowledgeService):
+
+    def __init__(self, driver, cache, lookup_mode='regex', fetch_strategy='bundle', max_concurrency=8, resolver_min_score=None):
+        if lookup_mode not in LOOKUP_MODES:
+            raise ValueError("Unknown lookup mode '" + lookup_mode + "', expected one of " + ", ".join(LOOKUP_MODES))
+        KnowledgeService.__init__(self, cache, fetch_strategy, max_concurrency, resolver_min_score)
+        self.driver = driver
+        self.lookup_mode = lookup_mode
+
+    def prepare(self):
+        if self.lookup_mode == 'normalized':
+            ensure_lookup_indexes(self.driver)
+        warm_up(self.driver, self.lookup_mode)
+        # the version is read first, so a re-ingest while the state loads is picked up by the next check
+        self.cache.check_version(lambda: read_graph_version(self.driver))
+        self._load_graph_state()
+
+    def _load_graph_state(self):
+        # the type whitelist and the resolver index are built from the graph, so they follow its version
+        self.type_whitelist = load_type_whitelist(self.driver)
+        KnowledgeService.prepare(self)
+
+    def check_version(self):
+        if self.cache.check_version(lambda: read_graph_version(self.driver)):
+            self._load_graph_state()
+
+    def close(self):
+        KnowledgeService.close(self)
+        self.driver.close()
+
+    def _entity_names(self):
+        return load_graph_names(self.driver)
+
+    def _read(self, name, query):
+        if query is not None:
+            return read(self.driver, *query, name=name)
+
+    def _similar(self, entity):
+        return self._read('similar', similar_query(entity, self.lookup_mode))
+
+    def _definition(self, entity):
+        return self._read('definition', definition_query(entity, self.lookup_mode))
+
+    def _primary_answer(self, entity, type):
+        return self._read('primary_answer', primary_answer_query(entity, type, self.lookup_mode, self.type_whitelist))
+
+    def _secondary_answer(self, entity, subject, object):
+        return self._read('secondary_answer', secondary_answer_query(entity, subject, object, self.lookup_mode, self.type_whitelist))
+
+    def _info(self, entity):
+        return self._read('info', info_query(entity, self.lookup_mode))
+
+    def bundle(self, entity, search_types, subject, object):
+        def load():
+            rows = self._timed('bundle', self._read, 'bundle', bundle_query(entity, search_types, subject, object, self.lookup_mode, self.type_whitelist))
+            return split_bundle(rows[0] if rows else None, entity, search_types, subject, object, self.type_whitelist)
+        return self.cache.get_or_load(('bundle', normalize_name(entity), tuple(t.lower() for t in search_types), subject.lower(), object.lower()), load)
+
+    def _read_batch(self, name, query):
+        rows = self._timed(name, self._read, name, query)
+        return group_by_lookup(rows) if rows is not None else {}
+
+    def similar_batch(self, names):
+        return self._read_batch('similar_batch', similar_batch_query(names, self.lookup_mode))
+
+    def definition_batch(self, names):
+        return self._read_batch('definition_batch', definition_batch_query(names, self.lookup_mode))
+
+    def info_batch(self, names):
+        return self._read_batch('info_batch', info_batch_query(names, self.lookup_mode))
+
+
+def resolver_min_score(config):
+    if not config.getboolean('resolver', 'enabled', fallback=False):
+        return None
+    return config.getfloat('resolver', 'min_score', fallback=0.5)
+
+
+def create_service(config):
+    backend = config.get('backend', 'type', fallback='neo4j')
+    if backend not in BACKENDS:
+        raise ValueError("Unknown backend '" + backend + "', expected one of " + ", ".join(BACKENDS))
+    fetch_strategy = config.get('lookup', 'fetch', fallback='bundle')
+    max_concurrency = config.getint('lookup', 'max_concurrency', fallback=8)
+    min_score = resolver_min_score(config)
+    if backend == 'snapshot':
+        # imported here since kg_snapshot builds on KnowledgeService
+        from kg_snapshot import SnapshotService
+        return SnapshotService.from_config(config, fetch_strategy, max_concurrency, min_score)
+    cache = create_cache(config)
+    register_cache('lookup', cache)
+    return Neo4jService(create_driver(config), cache,
+                        lookup_mode=config.get('lookup', 'mode', fallback='regex'),
+                        fetch_strategy=fetch_strategy, max_concurrency=max_concurrency, resolver_min_score=min_score)
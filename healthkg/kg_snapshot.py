@@ -0,0 +1,251 @@
+from array import array
+
+from kg_cache import ResultCache, read_graph_version
+from kg_db import create_driver, read
+from kg_lookup import normalize_name
+from kg_queries import ANSWER_COLUMN, resolve_type
+from kg_service import KnowledgeService
+from kg_snapshot_file import MappedSnapshot
+
+SIMILAR_TYPES = ['Disease', 'Condition', 'Medication']
+DEFINITION_TYPES = ['Disease', 'Condition', 'Vaccination', 'Medication']
+SIMILAR_RELATIONSHIP = 'related_to'
+
+NODES_QUERY = """
+              match (n)
+              return id(n) as id, n.name as name, n.type as type, n.text as text, n.source as source, 'Info' in labels(n) as info
+              """
+
+RELATIONSHIPS_QUERY = """
+                      match (a)-[r]->(b)
+                      return id(a) as start, id(b) as end, type(r) as rel_type, r.name as name, r.text as text, r.source as source, r.type as type
+                      """
+
+NULL = -1
+
+
+class GraphSnapshot:
+    """Read-only copy of the graph in flat arrays.
+
+    Strings are interned into one table and every property is a column of string ids
+    (NULL for a missing value). Relationships are reachable from both endpoints through
+    CSR offsets, and nodes and relationships are indexed by their normalized name.
+    """
+
+    def __init__(self, strings, nodes, edges):
+        self.strings = strings
+        self.string_ids = {string: i for i, string in enumerate(strings)}
+        self.nodes = nodes
+        self.edges = edges
+        self.node_count = len(nodes['name'])
+        self.out_offsets, self.out_edges = self._csr(edges['start'])
+        self.in_offsets, self.in_edges = self._csr(edges['end'])
+        self.node_index = self._name_index(nodes['key'])
+        self.edge_index = self._name_index(edges['key'])
+
+    @classmethod
+    def build(cls, nodes, relationships):
+        # nodes: dicts with id, name, type, text, source and info; relationships: dicts with
+        # start, end, rel_type, name, text, source and type, as returned by NODES_QUERY and RELATIONSHIPS_QUERY
+        strings, string_ids = [], {}
+
+        def intern(value):
+            if value is None:
+                return NULL
+            value = str(value)
+            if value not in string_ids:
+                string_ids[value] = len(strings)
+                strings.append(value)
+            return string_ids[value]
+
+        node_columns = {column: array('i') for column in ['name', 'key', 'type', 'text', 'source']}
+        node_columns['info'] = array('b')
+        node_positions = {}
+        for node in nodes:
+            node_positions[node['id']] = len(node_positions)
+            for column in ['name', 'type', 'text', 'source']:
+                node_columns[column].append(intern(node.get(column)))
+            node_columns['key'].append(intern(normalize_name(node['name'])) if node.get('name') is not None else NULL)
+            node_columns['info'].append(1 if node.get('info') else 0)
+
+        edge_columns = {column: array('i') for column in ['start', 'end', 'rel_type', 'name', 'key', 'text', 'source', 'type']}
+        for relationship in relationships:
+            edge_columns['start'].append(node_positions[relationship['start']])
+            edge_columns['end'].append(node_positions[relationship['end']])
+            for column in ['rel_type', 'name', 'text', 'source', 'type']:
+                edge_columns[column].append(intern(relationship.get(column)))
+            edge_columns['key'].append(intern(normalize_name(relationship['name'])) if relationship.get('name') is not None else NULL)
+
+        return cls(strings, node_columns, edge_columns)
+
+    def _csr(self, endpoints):
+        offsets = array('i', [0] * (self.node_count + 1))
+        for node in endpoints:
+            offsets[node + 1] += 1
+        for i in range(self.node_count):
+            offsets[i + 1] += offsets[i]
+        edges = array('i', [0] * len(endpoints))
+        fill = array('i', offsets[:-1])
+        for edge, node in enumerate(endpoints):
+            edges[fill[node]] = edge
+            fill[node] += 1
+        return offsets, edges
+
+    def _name_index(self, keys):
+        index = {}
+        for position, key in enumerate(keys):
+            if key != NULL:
+                index.setdefault(key, []).append(position)
+        return {key: array('i', positions) for key, positions in index.items()}
+
+    def string(self, string_id):
+        return self.strings[string_id] if string_id != NULL else None
+
+    def string_id(self, string):
+        return self.string_ids.get(string, NULL) if string is not None else NULL
+
+    def nodes_named(self, name):
+        return self.node_index.get(self.string_id(normalize_name(name)), ())
+
+    def edges_named(self, name):
+        return self.edge_index.get(self.string_id(normalize_name(name)), ())
+
+    def neighbours(self, node):
+        # (edge, other endpoint) for every relationship of the node, in either direction
+        start, end = self.edges['start'], self.edges['end']
+        for i in range(self.out_offsets[node], self.out_offsets[node + 1]):
+            edge = self.out_edges[i]
+            yield edge, end[edge]
+        for i in range(self.in_offsets[node], self.in_offsets[node + 1]):
+            edge = self.in_edges[i]
+            yield edge, start[edge]
+
+    def node_types(self):
+        return {self.string(type_id) for type_id in set(self.nodes['type']) if type_id != NULL}
+
+
+def export_snapshot(driver):
+    return GraphSnapshot.build(read(driver, NODES_QUERY, name='export_nodes'), read(driver, RELATIONSHIPS_QUERY, name='export_relationships'))
+
+
+class SnapshotService(KnowledgeService):
+    """Serves the five lookups from a GraphSnapshot with the semantics of the Cypher queries."""
+
+    def __init__(self, graph, fetch_strategy='separate', max_concurrency=8, resolver_min_score=None):
+        # graph is a GraphSnapshot, or a MappedSnapshot opened from a snapshot file
+        # lookups are in-process, so there is nothing worth caching
+        KnowledgeService.__init__(self, ResultCache(max_size=0), fetch_strategy, max_concurrency, resolver_min_score)
+        self.graph = graph
+        self.type_whitelist = {node_type.lower(): node_type for node_type in graph.node_types()}
+
+    @classmethod
+    def from_config(cls, config, fetch_strategy='separate', max_concurrency=8, resolver_min_score=None):
+        path = config.get('backend', 'snapshot_path', fallback='')
+        if path != '':
+            graph = MappedSnapshot(path, verify=config.getboolean('backend', 'verify_checksum', fallback=False))
+            if config.getboolean('backend', 'check_graph_version', fallback=True):
+                driver = create_driver(config)
+                try:
+                    graph_version = read_graph_version(driver)
+                finally:
+                    driver.close()
+                if graph_version != graph.graph_version:
+                    raise ValueError("Snapshot " + path + " was built from graph version " + str(graph.graph_version)
+                                     + " but the database is at " + str(graph_version) + ", rebuild it with kg_snapshot_file.py build")
+            return cls(graph, fetch_strategy, max_concurrency, resolver_min_score)
+
+        driver = create_driver(config)
+        try:
+            graph = export_snapshot(driver)
+        finally:
+            driver.close()
+        return cls(graph, fetch_strategy, max_concurrency, resolver_min_score)
+
+    def _entity_names(self):
+        # snapshots keep no alias property, so only node and relationship names are indexed
+        g = self.graph
+        name_ids = set(g.nodes['name']) | set(g.edges['name'])
+        return [(g.string(name_id), g.string(name_id)) for name_id in name_ids if name_id != NULL]
+
+    def _type_ids(self, types):
+        return {self.graph.string_id(node_type) for node_type in types} - {NULL}
+
+    def _has_text(self, node):
+        text = self.graph.nodes['text'][node]
+        return text != NULL and self.graph.string(text) != ''
+
+    def _similar(self, entity):
+        if entity == '':
+            return None
+        g = self.graph
+        type_ids = self._type_ids(SIMILAR_TYPES)
+        related_to = g.string_id(SIMILAR_RELATIONSHIP)
+        rows = {}
+        for n in g.nodes_named(entity):
+            if g.nodes['type'][n] in type_ids and self._has_text(n):
+                for edge, x in g.neighbours(n):
+                    if g.edges['rel_type'][edge] == related_to:
+                        rows[(g.nodes['name'][x], g.nodes['name'][n])] = None
+        return [{'Most_Similar': g.string(x), 'Name': g.string(name)} for x, name in rows]
+
+    def _definition(self, entity):
+        if entity == '':
+            return None
+        g = self.graph
+        type_ids = self._type_ids(DEFINITION_TYPES)
+        rows = {}
+        for n in g.nodes_named(entity):
+            if g.nodes['type'][n] in type_ids and self._has_text(n):
+                rows[(g.nodes['text'][n], g.nodes['source'][n], g.nodes['name'][n])] = None
+        return [{'Definition': g.string(text), 'Source': g.string(source), 'Name': g.string(name)}
+                for text, source, name in rows]
+
+    def _primary_answer(self, entity, type):
+        node_type = resolve_type(type, self.type_whitelist)
+        if entity == '' or node_type is None or node_type.lower() == entity.lower():
+            return None
+        g = self.graph
+        type_id = g.string_id(node_type)
+        key_id = g.string_id(normalize_name(entity))
+        rows = {}
+        for edge in g.edges_named(entity):
+            start, end = g.edges['start'][edge], g.edges['end'][edge]
+            for n, x in ((start, end), (end, start)):
+                if g.nodes['type'][n] == type_id and g.nodes['key'][x] != key_id:
+                    rows[(g.nodes['name'][x], g.edges['source'][edge], g.edges['text'][edge], g.edges['name'][edge])] = None
+        return [{ANSWER_COLUMN: g.string(x), 'Source': g.string(source), 'Notes': g.string(text), 'Name': g.string(name)}
+                for x, source, text, name in rows]
+
+    def _secondary_answer(self, entity, subject, object):
+        subject_type = resolve_type(subject, self.type_whitelist)
+        object_type = resolve_type(object, self.type_whitelist)
+        if entity == '' or subject_type is None or object_type is None:
+            return None
+        g = self.graph
+        subject_id, object_id = g.string_id(subject_type), g.string_id(object_type)
+        rows = {}
+        for n in g.nodes_named(entity):
+            if g.nodes['type'][n] != subject_id:
+                continue
+            incident = list(g.neighbours(n))
+            object_edges = [edge for edge, x in incident if g.nodes['type'][x] == object_id]
+            if not object_edges:
+                continue
+            for edge, y in incident:
+                y_type = g.nodes['type'][y]
+                # Cypher never binds one relationship to both r1 and r2
+                if y_type != NULL and y_type != object_id and any(r1 != edge for r1 in object_edges):
+                    rows[(g.edges['name'][edge], g.nodes['name'][y], g.edges['source'][edge], g.edges['text'][edge])] = None
+        return [{'Type': g.string(name), ANSWER_COLUMN: g.string(y), 'Source': g.string(source), 'Notes': g.string(text)}
+                for name, y, source, text in rows]
+
+    def _info(self, entity):
+        if entity == '':
+            return None
+        g = self.graph
+        rows = {}
+        for edge in g.edges_named(entity):
+            if g.nodes['info'][g.edges['start'][edge]] or g.nodes['info'][g.edges['end'][edge]]:
+                rows[(g.edges['text'][edge], g.edges['source'][edge], g.edges['name'][edge], g.edges['type'][edge])] = None
+        return [{'Info': g.string(text), 'Source': g.string(source), 'Name': g.string(name), 'Type': g.string(type)}
+                for text, source, name, type in rows]
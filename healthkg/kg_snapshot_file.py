@@ -0,0 +1,196 @@
+import argparse
+import hashlib
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from kg_cache import read_graph_version
+from kg_db import create_driver, load_config
+from kg_lookup import normalize_name
+
+# On-disk snapshot layout, little-endian:
+#   header   magic, format version, graph version, sha256 of the payload, section count
+#   sections name, typecode, payload offset and length of each section, zero-padded to a multiple of 8 bytes
+#   payload  the section bytes, each section 8-byte aligned; the payload itself starts 8-byte aligned,
+#            so the mmap'd columns are aligned in memory too
+MAGIC = b'HKGS'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<4sIq32sI')
+SECTION = struct.Struct('<32s1sQQ')
+NO_GRAPH_VERSION = -1
+
+NODE_COLUMNS = ['name', 'key', 'type', 'text', 'source', 'info']
+EDGE_COLUMNS = ['start', 'end', 'rel_type', 'name', 'key', 'text', 'source', 'type']
+NULL = -1
+
+
+def _payload_start(section_count):
+    size = HEADER.size + SECTION.size * section_count
+    return size + -size % 8
+
+
+def _index_arrays(index):
+    keys, offsets, positions = array('i'), array('i', [0]), array('i')
+    for key in sorted(index):
+        keys.append(key)
+        positions.extend(index[key])
+        offsets.append(len(positions))
+    return keys, offsets, positions
+
+
+def write_snapshot(graph, path, graph_version=None):
+    encoded = [string.encode('utf-8') for string in graph.strings]
+    string_offsets = array('q', [0])
+    for data in encoded:
+        string_offsets.append(string_offsets[-1] + len(data))
+    # string ids ordered by their bytes, so a name can be found without building a dict on open
+    string_order = array('i', sorted(range(len(encoded)), key=encoded.__getitem__))
+
+    sections = [('string_offsets', string_offsets), ('string_data', b''.join(encoded)), ('string_order', string_order),
+                ('node_types', array('i', sorted(graph.string_id(t) for t in graph.node_types())))]
+    sections += [('node.' + column, graph.nodes[column]) for column in NODE_COLUMNS]
+    sections += [('edge.' + column, graph.edges[column]) for column in EDGE_COLUMNS]
+    sections += [('out_offsets', graph.out_offsets), ('out_edges', graph.out_edges),
+                 ('in_offsets', graph.in_offsets), ('in_edges', graph.in_edges)]
+    for name, index in [('node_index', graph.node_index), ('edge_index', graph.edge_index)]:
+        keys, offsets, positions = _index_arrays(index)
+        sections += [(name + '.keys', keys), (name + '.offsets', offsets), (name + '.positions', positions)]
+
+    payload = bytearray()
+    table = []
+    for name, data in sections:
+        typecode = data.typecode if isinstance(data, array) else 'B'
+        raw = data.tobytes() if isinstance(data, array) else data
+        table.append((name, typecode, len(payload), len(raw)))
+        payload += raw
+        payload += b'\0' * (-len(payload) % 8)
+
+    checksum = hashlib.sha256(payload).digest()
+    version = graph_version if graph_version is not None else NO_GRAPH_VERSION
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, version, checksum, len(table)))
+        for name, typecode, offset, length in table:
+            f.write(SECTION.pack(name.encode('ascii'), typecode.encode('ascii'), offset, length))
+        f.write(b'\0' * (_payload_start(len(table)) - f.tell()))
+        f.write(payload)
+    return checksum.hex()
+
+
+class MappedSnapshot:
+    """A snapshot file opened with mmap; every column is a zero-copy view into the shared pages.
+
+    Implements the same read interface as GraphSnapshot, so SnapshotService can serve from either.
+    """
+
+    def __init__(self, path, verify=False):
+        if sys.byteorder != 'little':
+            raise ValueError("Snapshot files are little-endian")
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, format_version, graph_version, checksum, section_count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(path + " is not a Health KG snapshot")
+        if format_version != FORMAT_VERSION:
+            raise ValueError("Snapshot format version " + str(format_version) + " is not supported, expected " + str(FORMAT_VERSION))
+        self.graph_version = graph_version if graph_version != NO_GRAPH_VERSION else None
+        self.checksum = checksum.hex()
+
+        payload_start = _payload_start(section_count)
+        assert payload_start % 8 == 0
+        payload = buffer[payload_start:]
+        if verify and hashlib.sha256(payload).digest() != checksum:
+            raise ValueError(path + " is corrupt: checksum mismatch")
+        sections = {}
+        for i in range(section_count):
+            name, typecode, offset, length = SECTION.unpack_from(buffer, HEADER.size + SECTION.size * i)
+            view = payload[offset:offset + length]
+            sections[name.rstrip(b'\0').decode('ascii')] = view.cast(typecode.decode('ascii')) if typecode != b'B' else view
+
+        self._string_offsets = sections['string_offsets']
+        self._string_data = sections['string_data']
+        self._string_order = sections['string_order']
+        self._node_types = sections['node_types']
+        self.nodes = {column: sections['node.' + column] for column in NODE_COLUMNS}
+        self.edges = {column: sections['edge.' + column] for column in EDGE_COLUMNS}
+        self.node_count = len(self.nodes['name'])
+        self.out_offsets, self.out_edges = sections['out_offsets'], sections['out_edges']
+        self.in_offsets, self.in_edges = sections['in_offsets'], sections['in_edges']
+        self._node_index = [sections['node_index.' + part] for part in ['keys', 'offsets', 'positions']]
+        self._edge_index = [sections['edge_index.' + part] for part in ['keys', 'offsets', 'positions']]
+
+    def _bytes(self, string_id):
+        return bytes(self._string_data[self._string_offsets[string_id]:self._string_offsets[string_id + 1]])
+
+    def string(self, string_id):
+        return self._bytes(string_id).decode('utf-8') if string_id != NULL else None
+
+    def string_id(self, string):
+        if string is None:
+            return NULL
+        target = string.encode('utf-8')
+        low, high = 0, len(self._string_order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._bytes(self._string_order[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._string_order) and self._bytes(self._string_order[low]) == target:
+            return self._string_order[low]
+        return NULL
+
+    def _lookup(self, index, name):
+        keys, offsets, positions = index
+        key = self.string_id(normalize_name(name))
+        i = bisect_left(keys, key)
+        if key == NULL or i == len(keys) or keys[i] != key:
+            return ()
+        return positions[offsets[i]:offsets[i + 1]]
+
+    def nodes_named(self, name):
+        return self._lookup(self._node_index, name)
+
+    def edges_named(self, name):
+        return self._lookup(self._edge_index, name)
+
+    def neighbours(self, node):
+        start, end = self.edges['start'], self.edges['end']
+        for i in range(self.out_offsets[node], self.out_offsets[node + 1]):
+            edge = self.out_edges[i]
+            yield edge, end[edge]
+        for i in range(self.in_offsets[node], self.in_offsets[node + 1]):
+            edge = self.in_edges[i]
+            yield edge, start[edge]
+
+    def node_types(self):
+        return {self.string(type_id) for type_id in self._node_types}
+
+
+def build(path):
+    # imported here since kg_snapshot opens snapshot files through this module
+    from kg_snapshot import export_snapshot
+    driver = create_driver(load_config())
+    try:
+        graph_version = read_graph_version(driver)
+        graph = export_snapshot(driver)
+    finally:
+        driver.close()
+    return write_snapshot(graph, path, graph_version), graph_version
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or inspect a memory-mapped Health KG snapshot")
+    parser.add_argument('command', choices=['build', 'info'])
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        checksum, graph_version = build(args.path)
+        print("Wrote", args.path, "for graph version", graph_version, "sha256", checksum)
+    else:
+        snapshot = MappedSnapshot(args.path, verify=True)
+        print(args.path, "format", FORMAT_VERSION, "graph version", snapshot.graph_version, "sha256", snapshot.checksum,
+              "nodes", snapshot.node_count, "relationships", len(snapshot.edges['start']))
@@ -0,0 +1,212 @@
+import argparse
+import json
+import random
+import resource
+import sys
+import time
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+
+from kg_cache import bump_graph_version
+from kg_db import create_driver, load_config
+from kg_frames import batch_frame, exclusion_pattern, lookup_tables, primary_answer_view, secondary_answer_groups, to_frame
+from kg_lookup import backfill
+from kg_metrics import current_trace, question_trace, timed, timed_call
+from kg_service import create_service, resolver_min_score
+from kg_snapshot import GraphSnapshot, SnapshotService
+from nlp_pipeline import load_pipeline
+from parse_benchmark import percentile
+from query_intent import parse_query
+from synthetic_kg import generate, load_into_neo4j
+
+# (weight, template) pairs; placeholders name the node type an entity is drawn from
+QUESTION_MIX = [
+    (4, "What is {Disease}?"),
+    (3, "What is the treatment for {Disease}?"),
+    (2, "What are the risk factors for {Disease}?"),
+    (2, "How to manage {Condition}?"),
+    (2, "What are the side effects of {Medication}?"),
+    (2, "What are the side effects of {Medication} medication?"),
+    (1, "What are the precautions for {Vaccination}?"),
+    (1, "How to pay for {Disease} medication?"),
+    (1, "Where can I get screening for {Disease}?"),
+]
+ENTITY_TYPES = ['Disease', 'Condition', 'Medication', 'Vaccination']
+
+# Report metrics checked against the baseline, and the direction that counts as a regression
+LOWER_IS_BETTER = ['p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb']
+HIGHER_IS_BETTER = ['throughput']
+REPORTED_STAGES = ['nlp', 'fetch', 'convert']
+
+
+def question_mix(graph, count, seed=0, skew=1.0, mix=QUESTION_MIX):
+    # entities are drawn with Zipf weights, so a few popular ones dominate as in real traffic
+    rng = random.Random(seed)
+    names = {t: graph.names[t] for t in ENTITY_TYPES}
+    cumulative = {t: list(accumulate(1.0 / (rank + 1) ** skew for rank in range(len(names[t])))) for t in ENTITY_TYPES}
+
+    def draw(entity_type):
+        weights = cumulative[entity_type]
+        return names[entity_type][min(bisect(weights, rng.random() * weights[-1]), len(weights) - 1)]
+
+    templates = rng.choices([template for _, template in mix], weights=[weight for weight, _ in mix], k=count)
+    return [template.format(**{t: draw(t) for t in ENTITY_TYPES if '{' + t + '}' in template}) for template in templates]
+
+
+def post_process(service, answers, intent, exclude=None):
+    # the conversions and follow-up lookups the app does before drawing an entity's answers
+    view = {'primary_answer': {}, 'secondary_answer': {}}
+    if answers['secondary_answer'] is not None:
+        type_tables = timed_call('convert', secondary_answer_groups, answers['secondary_answer'], intent.subject, exclude)
+        classes = timed_call('fetch', service.similar_batch, type_tables.keys()) if type_tables else {}
+        view['secondary_answer'] = {name: (classes.get(str(name), []), tables) for name, tables in type_tables.items()}
+    for search_type, rows in answers['primary_answer'].items():
+        if rows is not None:
+            view['primary_answer'][search_type] = timed_call('convert', primary_answer_view, rows, search_type, exclude)
+
+    with timed('convert'):
+        view['definition'] = to_frame(answers['definition'], 'definition')
+        view['info'] = to_frame(answers['info'], 'info')
+        similar = to_frame(answers['similar'], 'similar')
+        related = list(similar['Most_Similar'])
+    related_info = timed_call('fetch', service.info_batch, related)
+    related_definitions = timed_call('fetch', service.definition_batch, related)
+    with timed('convert'):
+        info_tables = lookup_tables(batch_frame(related_info, 'info'), ['Name', 'Type'])
+        definition_tables = lookup_tables(batch_frame(related_definitions, 'definition'), ['Name'])
+        view['related'] = [(item, info_tables.get(str(item), []), definition_tables.get(str(item), [])) for item in related]
+    return view
+
+
+def answer_question(service, nlp, question, exclude=None):
+    # parse -> lookup -> post-process with the app's conversions minus the drawing; like /ask it looks up
+    # every entity in lookup_names, where the app looks up at most one per question
+    intent = parse_query(timed_call('nlp', nlp, question))
+    trace = current_trace()
+    if trace is not None:
+        trace.intent_types = intent.search_types
+    views = []
+    for name in intent.lookup_names():
+        answers = timed_call('fetch', service.fetch_entity, name, intent.search_types, intent.subject, intent.object)
+        views.append(post_process(service, answers, intent, exclude))
+    return views
+
+
+def run_load(service, nlp, questions, concurrency=1, exclude=None):
+    def ask(question):
+        with question_trace(question) as trace:
+            answer_question(service, nlp, question, exclude)
+        return trace
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            traces = list(pool.map(ask, questions))
+    else:
+        traces = [ask(question) for question in questions]
+    return traces, time.perf_counter() - start
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(traces, elapsed):
+    totals = sorted(trace.total for trace in traces)
+    stages = [dict(trace.breakdown()) for trace in traces]
+    return {'questions': len(totals),
+            'throughput': len(totals) / elapsed if elapsed > 0 else 0.0,
+            'p50_ms': percentile(totals, 50) * 1000,
+            'p95_ms': percentile(totals, 95) * 1000,
+            'p99_ms': percentile(totals, 99) * 1000,
+            'peak_rss_mb': peak_rss_mb(),
+            'stage_p50_ms': {stage: percentile(sorted(s.get(stage, 0.0) for s in stages), 50) for stage in REPORTED_STAGES}}
+
+
+def compare(report, baseline, tolerance=0.2):
+    # a regression is any metric more than tolerance worse than the baseline
+    regressions = []
+    for metric in LOWER_IS_BETTER:
+        if report[metric] > baseline[metric] * (1 + tolerance):
+            regressions.append("%s %.2f is above the baseline %.2f" % (metric, report[metric], baseline[metric]))
+    for metric in HIGHER_IS_BETTER:
+        if report[metric] < baseline[metric] * (1 - tolerance):
+            regressions.append("%s %.2f is below the baseline %.2f" % (metric, report[metric], baseline[metric]))
+    return regressions
+
+
+def create_benchmark_service(config, backend, graph, load=False):
+    if backend == 'snapshot':
+        return SnapshotService(GraphSnapshot.build(graph.nodes, graph.relationships),
+                               config.get('lookup', 'fetch', fallback='bundle'),
+                               config.getint('lookup', 'max_concurrency', fallback=8), resolver_min_score(config))
+    if load:
+        driver = create_driver(config)
+        try:
+            load_into_neo4j(driver, graph)
+            backfill(driver)
+            bump_graph_version(driver)
+        finally:
+            driver.close()
+    if not config.has_section('backend'):
+        config.add_section('backend')
+    config.set('backend', 'type', 'neo4j')
+    return create_service(config)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a question mix against a synthetic Health KG and check it against a baseline")
+    parser.add_argument('--backend', choices=['snapshot', 'neo4j'], default='snapshot')
+    parser.add_argument('--load', action='store_true', help="load the synthetic graph into the configured, otherwise empty, Neo4j first")
+    parser.add_argument('--scale', type=int, default=500, help="number of diseases in the synthetic graph")
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--warmup', type=int, default=100, help="untimed questions before measuring")
+    parser.add_argument('--concurrency', type=int, default=1, help="questions in flight at once, on threads")
+    parser.add_argument('--skew', type=float, default=1.0, help="Zipf exponent of entity popularity")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default='load_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline instead of checking it")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown relative to the baseline")
+    args = parser.parse_args()
+
+    config = load_config()
+    setup = {'backend': args.backend, 'scale': args.scale, 'questions': args.questions,
+             'concurrency': args.concurrency, 'skew': args.skew, 'seed': args.seed,
+             'fetch': config.get('lookup', 'fetch', fallback='bundle')}
+    graph = generate(args.scale, seed=args.seed)
+    print("Synthetic graph: %d nodes, %d relationships" % (len(graph.nodes), len(graph.relationships)))
+    service = create_benchmark_service(config, args.backend, graph, args.load)
+    service.prepare()
+    nlp = load_pipeline(config)
+    exclude = exclusion_pattern(config)
+
+    run_load(service, nlp, question_mix(graph, args.warmup, args.seed + 1, args.skew), args.concurrency, exclude)
+    traces, elapsed = run_load(service, nlp, question_mix(graph, args.questions, args.seed, args.skew), args.concurrency, exclude)
+    service.close()
+    report = summarize(traces, elapsed)
+
+    print("%d questions  %.1f q/s  p50 %.2f ms  p95 %.2f ms  p99 %.2f ms  peak RSS %.1f MB"
+          % (report['questions'], report['throughput'], report['p50_ms'], report['p95_ms'], report['p99_ms'], report['peak_rss_mb']))
+    print("stage p50: " + "  ".join("%s %.2f ms" % (stage, ms) for stage, ms in report['stage_p50_ms'].items()))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'setup': setup, 'report': report}, f, indent=2)
+        print("Saved baseline to", args.baseline)
+        sys.exit(0)
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print("No baseline at", args.baseline + ", run with --save-baseline to record one")
+        sys.exit(0)
+    if baseline['setup'] != setup:
+        print("Baseline was recorded with", baseline['setup'], "and cannot be compared with", setup)
+        sys.exit(2)
+    regressions = compare(report, baseline['report'], args.tolerance)
+    for regression in regressions:
+        print("REGRESSION:", regression)
+    sys.exit(1 if regressions else 0)
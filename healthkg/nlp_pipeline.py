@@ -0,0 +1,49 @@
+from pathlib import Path
+
+import spacy
+
+PIPELINE_MODES = ['full', 'lite']
+
+# The query parser reads dep_, pos_, lemma_, i and doc.ents, so only these components are kept in lite mode
+REQUIRED_COMPONENTS = ['tok2vec', 'tagger', 'morphologizer', 'attribute_ruler', 'lemmatizer', 'parser', 'ner']
+
+
+def model_data_path(model):
+    if not spacy.util.is_package(model):
+        return Path(model)
+    # packaged pipelines keep their data in a <lang>_<name>-<version> sub-directory
+    package_path = spacy.util.get_package_path(model)
+    meta = spacy.util.load_meta(package_path / 'meta.json')
+    return package_path / (meta['lang'] + '_' + meta['name'] + '-' + meta['version'])
+
+
+def _uses_static_vectors(section):
+    if isinstance(section, dict):
+        return any(
+            (key == 'include_static_vectors' and value is True) or _uses_static_vectors(value)
+            for key, value in section.items())
+    return False
+
+
+def lite_exclude(model, similarity=False):
+    config = spacy.util.load_config(model_data_path(model) / 'config.cfg', interpolate=False)
+    exclude = [name for name in config['nlp']['pipeline'] if name not in REQUIRED_COMPONENTS]
+    # word vectors are only skipped when similarity is off and no component was trained on them
+    if not similarity and not _uses_static_vectors(config['components']):
+        exclude.append('vectors')
+    return exclude
+
+
+def load_pipeline(config):
+    model = config.get('nlp', 'model', fallback='en_core_sci_lg')
+    mode = config.get('nlp', 'mode', fallback='full')
+    if mode not in PIPELINE_MODES:
+        raise ValueError("Unknown pipeline mode '" + mode + "', expected one of " + ", ".join(PIPELINE_MODES))
+    if mode == 'lite':
+        return spacy.load(model, exclude=lite_exclude(model, config.getboolean('nlp', 'similarity', fallback=False)))
+    return spacy.load(model)
+
+
+def query_key(query):
+    # parse results are memoized per whitespace-normalized query; case is kept since NER is case-sensitive
+    return ' '.join(query.split())
@@ -0,0 +1,65 @@
+import argparse
+import time
+
+from kg_db import load_config
+from nlp_pipeline import load_pipeline
+from query_intent import parse_query
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {'count': len(latencies),
+            'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000}
+
+
+def read_corpus(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def run_benchmark(nlp, queries, repeat=1):
+    # the spaCy parse and the intent extraction are timed separately so mapping changes show up on their own
+    parse_latencies, intent_latencies = [], []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            t0 = time.perf_counter()
+            doc = nlp(query)
+            t1 = time.perf_counter()
+            parse_query(doc)
+            t2 = time.perf_counter()
+            parse_latencies.append(t1 - t0)
+            intent_latencies.append(t2 - t1)
+    elapsed = time.perf_counter() - start
+    return {'nlp': summarize(parse_latencies, sum(parse_latencies)),
+            'intent': summarize(intent_latencies, sum(intent_latencies)),
+            'total': summarize([p + i for p, i in zip(parse_latencies, intent_latencies)], elapsed)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark query intent parsing over a corpus of recorded questions")
+    parser.add_argument('corpus', nargs='?', default='benchmark_queries.txt', help="text file with one question per line")
+    parser.add_argument('--repeat', type=int, default=5, help="number of passes over the corpus")
+    parser.add_argument('--warmup', type=int, default=1, help="untimed passes before measuring")
+    args = parser.parse_args()
+
+    queries = read_corpus(args.corpus)
+    t0 = time.perf_counter()
+    nlp = load_pipeline(load_config())
+    print("Pipeline loaded in %.2fs" % (time.perf_counter() - t0))
+    for _ in range(args.warmup):
+        for query in queries:
+            parse_query(nlp(query))
+
+    for stage, stats in run_benchmark(nlp, queries, args.repeat).items():
+        print("%-7s %6d queries  %9.1f q/s  p50 %8.3f ms  p99 %8.3f ms"
+              % (stage, stats['count'], stats['throughput'], stats['p50_ms'], stats['p99_ms']))
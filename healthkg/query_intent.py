@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from typing import Tuple
+
+# Token dependency labels that carry each part of the question
+COMPOUND_DEPS = ['compound']
+MODIFIER_DEPS = ['amod']
+SUBJECT_DEPS = ['nsubj']
+OBJECT_DEPS = ['dobj', 'pobj', 'nmod']
+NOUN_INTENT_DEPS = ['nsubj', 'nmod', 'conj', 'ROOT', 'dobj', 'pobj']
+VERB_INTENT_DEPS = ['ROOT', 'conj', 'relcl', 'ccomp', 'xcomp']
+
+# lemma -> subject/object/search type; nouns and verbs without an entry search by their own lemma
+SUBJECT_LEMMAS = {
+    'effect': 'effect',
+    'instruction': 'instruction',
+    'precaution': 'precaution',
+}
+
+OBJECT_LEMMAS = {
+    'vaccine': 'vaccination',
+    'medicine': 'medication',
+    'medication': 'medication',
+}
+
+NOUN_INTENTS = {
+    'effect': 'effect',
+    'cure': 'prescription',
+    'medication': 'prescription',
+    'medicine': 'prescription',
+    'treatment': 'prescription',
+    'management': 'management',
+    'screening': 'checkup',
+    'risk': 'riskfactor',
+    'bill': 'expenses',
+    'expense': 'expenses',
+    'payment': 'expenses',
+    'subsidy': 'expenses',
+    'vaccine': 'vaccination',
+}
+
+VERB_INTENTS = {
+    'avoid': 'management',
+    'manage': 'management',
+    'prevent': 'management',
+    'cure': 'prescription',
+    'medicate': 'prescription',
+    'treat': 'prescription',
+    'check': 'test',
+    'detect': 'test',
+    'test': 'test',
+    'screen': 'checkup',
+    'expense': 'expenses',
+    'subsidise': 'expenses',
+    'subsidize': 'expenses',
+    'pay': 'expenses',
+}
+
+
+@dataclass(frozen=True)
+class QueryIntent:
+    search_types: Tuple[str, ...] = ()
+    subject: str = ''
+    object: str = ''
+    compound: str = ''
+    entities: Tuple[str, ...] = ()
+
+    def lookup_names(self):
+        # every entity, multi-word ones by the assembled compound as the app does; the app itself
+        # looks up at most one entity per question, and only when the question has a compound noun
+        names = []
+        for entity in self.entities:
+            name = self.compound if len(entity.split()) > 1 and self.compound != '' else entity
+            if name not in names:
+                names.append(name)
+        return names
+
+    def to_dict(self):
+        return {'search_types': list(self.search_types), 'subject': self.subject, 'object': self.object,
+                'compound': self.compound, 'entities': list(self.entities)}
+
+
+def parse_query(doc):
+    # doc is a parsed spaCy Doc, or anything with tokens exposing dep_, pos_, lemma_ and i and an ents sequence
+    search_types = []
+    subject, object, compound = '', '', ''
+    compound_parts = {}
+
+    for token in doc:
+        if token.dep_ in COMPOUND_DEPS and token.pos_ == 'NOUN':
+            compound_parts['compound'] = token.lemma_
+            compound_parts['compound_idx'] = token.i
+            compound = token.lemma_
+        if token.dep_ in MODIFIER_DEPS and token.pos_ == 'ADJ':
+            compound_parts['modifier'] = token.lemma_
+            compound_parts['modifier_idx'] = token.i
+
+        if token.pos_ == 'NOUN':
+            if token.dep_ in SUBJECT_DEPS:
+                subject = SUBJECT_LEMMAS.get(token.lemma_, subject)
+            elif token.dep_ in OBJECT_DEPS:
+                object = OBJECT_LEMMAS.get(token.lemma_, object)
+
+        search_type = ''
+        if token.dep_ in NOUN_INTENT_DEPS and token.pos_ == 'NOUN':
+            search_type = NOUN_INTENTS.get(token.lemma_, token.lemma_)
+        elif token.dep_ in VERB_INTENT_DEPS and token.pos_ == 'VERB':
+            search_type = VERB_INTENTS.get(token.lemma_, token.lemma_)
+        if search_type != '':
+            search_types.append(search_type)
+
+    # an adjective directly before the compound noun is part of the entity, e.g. "high blood pressure"
+    if 'modifier_idx' in compound_parts and 'compound_idx' in compound_parts:
+        if compound_parts['compound_idx'] - compound_parts['modifier_idx'] == 1:
+            compound = compound_parts['modifier'] + ' ' + compound_parts['compound']
+
+    return QueryIntent(search_types=tuple(search_types), subject=subject, object=object, compound=compound,
+                       entities=tuple(str(ent.text) for ent in doc.ents))
@@ -0,0 +1,208 @@
+import argparse
+import itertools
+import json
+import random
+import sys
+
+from kg_db import create_driver, load_config
+
+# Word lists for names that read like the real graph's, so the NER model still picks them out
+QUALIFIERS = ['', 'acute', 'chronic', 'juvenile', 'hereditary', 'severe', 'gestational', 'secondary']
+DISEASE_STEMS = ['nephritis', 'carditis', 'dermatitis', 'hepatitis', 'arthritis', 'gastritis', 'bronchitis',
+                 'myopathy', 'neuropathy', 'anaemia', 'diabetes', 'hypertension', 'asthma', 'influenza']
+CONDITION_STEMS = ['high blood sugar', 'high cholesterol', 'obesity', 'insomnia', 'fatigue', 'dehydration']
+DRUG_STEMS = ['cardi', 'neph', 'glu', 'lipo', 'hepa', 'derma', 'osteo', 'pulmo', 'gastro', 'neuro']
+
+# Medication name suffix -> the class it belongs to, which secondary answers are grouped by
+DRUG_CLASSES = {
+    'pril': 'ACE inhibitor',
+    'olol': 'Beta blocker',
+    'statin': 'Statin',
+    'formin': 'Biguanide',
+    'sartan': 'Angiotensin receptor blocker',
+    'vir': 'Antiviral',
+}
+
+SYMPTOMS = ['nausea', 'headache', 'dizziness', 'rash', 'fatigue', 'cough', 'insomnia', 'diarrhoea',
+            'muscle pain', 'dry mouth', 'swelling', 'blurred vision']
+ADVICE = ['rest after the injection', 'drink plenty of water', 'avoid alcohol', 'see a doctor if feverish',
+          'inform the nurse of allergies', 'bring your vaccination record']
+SOURCES = ['MOH', 'HPB', 'HealthHub']
+INFO_TYPES = ['Support Group', 'Diet', 'Exercise', 'Financial Assistance']
+
+# Answer types reached through a hub node of that type, keyed by the search type they answer
+ANSWER_TYPES = ['Prescription', 'Management', 'Riskfactor', 'Checkup', 'Test', 'Expenses']
+
+
+def _names(stems, count, qualifiers=QUALIFIERS):
+    # qualifier and stem combinations, numbered once they run out
+    names = [(q + ' ' + s).strip() for q, s in itertools.product(qualifiers, stems)]
+    for i in range(count):
+        yield names[i % len(names)] + ('' if i < len(names) else ' type ' + str(i // len(names) + 1))
+
+
+def _drug_class(name):
+    # the class of a medication named by _names, from the suffix before any ' type N'
+    stem = name.split(' type ')[0]
+    return DRUG_CLASSES[next(suffix for suffix in DRUG_CLASSES if stem.endswith(suffix))]
+
+
+class SyntheticGraph:
+    """A generated Health KG in the row shapes of kg_snapshot's NODES_QUERY and RELATIONSHIPS_QUERY."""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.nodes = []
+        self.relationships = []
+        self.names = {}
+
+    def node(self, name, type, text=None, info=False):
+        node_id = len(self.nodes)
+        self.nodes.append({'id': node_id, 'name': name, 'type': type, 'text': text,
+                           'source': self.random.choice(SOURCES), 'info': info})
+        self.names.setdefault(type, []).append(name)
+        return node_id
+
+    def entity(self, name, type):
+        return self.node(name, type, text=type + " " + name + " as described by the synthetic knowledge graph.")
+
+    def relate(self, start, end, rel_type, name=None, text=None, type=None):
+        self.relationships.append({'start': start, 'end': end, 'rel_type': rel_type, 'name': name, 'text': text,
+                                   'source': self.random.choice(SOURCES), 'type': type})
+
+    def sample(self, population, k):
+        return self.random.sample(population, min(k, len(population)))
+
+    def notes(self):
+        # most answers carry no notes, as in the real graph
+        return self.random.choice([None, None, None, "Synthetic note."])
+
+
+def generate(scale=100, answers_per_type=3, seed=0):
+    """Builds a graph with `scale` diseases and the other node types in proportion to it."""
+    g = SyntheticGraph(seed)
+    pick = g.sample
+
+    diseases = [g.entity(name, 'Disease') for name in _names(DISEASE_STEMS, scale)]
+    conditions = [g.entity(name, 'Condition') for name in _names(CONDITION_STEMS, max(1, scale // 2))]
+    drug_names = [stem.title() + suffix for stem, suffix in itertools.product(DRUG_STEMS, DRUG_CLASSES)]
+    medications = [g.entity(name, 'Medication') for name in _names(drug_names, scale * 2, [''])]
+    vaccinations = [g.entity(g.nodes[d]['name'] + ' vaccine', 'Vaccination') for d in diseases[:max(1, scale // 4)]]
+    symptoms = [g.node(name, 'Symptom') for name in _names(SYMPTOMS, 50 + scale, ['', 'mild', 'severe'])]
+    advice = [g.node(name, 'Advice') for name in ADVICE]
+
+    # related_to links similar entities, and every medication to its class
+    for d in diseases:
+        for other in pick(diseases, 3) + pick(conditions, 1):
+            if other != d:
+                g.relate(d, other, 'related_to')
+    classes = {class_name: g.entity(class_name, 'Medication') for class_name in DRUG_CLASSES.values()}
+    for m in medications:
+        g.relate(classes[_drug_class(g.nodes[m]['name'])], m, 'related_to')
+
+    # primary answers: (hub of the answer type)-[r {name: entity}]-(answer)
+    hubs = {answer_type: g.node(answer_type, answer_type) for answer_type in ANSWER_TYPES}
+    for entity in diseases + conditions:
+        name = g.nodes[entity]['name']
+        for answer_type, hub in hubs.items():
+            candidates = medications if answer_type == 'Prescription' else symptoms
+            for answer in pick(candidates, answers_per_type):
+                g.relate(hub, answer, answer_type.lower(), name=name, text=g.notes())
+
+    # side effects: the effect node of a medication answers both the primary lookup,
+    # (effect node)-[r {name: medication}]-(symptom), and the secondary one,
+    # (medication)-(effect node of the same name)-[r2 {name: class}]-(symptom)
+    for m in medications:
+        name = g.nodes[m]['name']
+        class_name = _drug_class(name)
+        effect = g.node(name, 'Effect')
+        g.relate(m, effect, 'has_effect')
+        for symptom in pick(symptoms, answers_per_type):
+            g.relate(effect, symptom, 'effect', name=name, text=g.notes())
+        for symptom in pick(symptoms, answers_per_type * 2):
+            g.relate(effect, symptom, 'effect', name=class_name, text=g.notes())
+    for v in vaccinations:
+        name = g.nodes[v]['name']
+        for answer_type in ['Instruction', 'Precaution']:
+            node = g.node(name, answer_type)
+            g.relate(v, node, 'has_' + answer_type.lower())
+            for item in pick(advice, answers_per_type):
+                g.relate(node, item, answer_type.lower(), name=name, text=g.notes())
+
+    # info: (n:Info)-[r {name: entity, type: info type}]-(entity)
+    infos = {info_type: g.node(info_type, 'Info', info=True) for info_type in INFO_TYPES}
+    for entity in diseases:
+        for info_type in pick(INFO_TYPES, 2):
+            g.relate(infos[info_type], entity, 'info', name=g.nodes[entity]['name'],
+                     text=info_type + " information for " + g.nodes[entity]['name'] + ".", type=info_type)
+    return g
+
+
+SYNTHETIC_LABEL = 'Synthetic'
+LOAD_BATCH_SIZE = 5000
+
+
+def _run_batches(session, query, rows):
+    for i in range(0, len(rows), LOAD_BATCH_SIZE):
+        session.run(query, rows=rows[i:i + LOAD_BATCH_SIZE]).consume()
+
+
+def load_into_neo4j(driver, graph):
+    # only ever writes to a database that holds nothing but an earlier synthetic graph
+    with driver.session() as session:
+        foreign = session.run("match (n) where not n:" + SYNTHETIC_LABEL + " and not n:GraphMeta return count(n) as count").single()['count']
+        if foreign:
+            raise ValueError("The database holds " + str(foreign) + " non-synthetic nodes, load the synthetic graph into an empty database")
+        session.run("match (n:" + SYNTHETIC_LABEL + ") call { with n detach delete n } in transactions of 10000 rows").consume()
+        session.run("create index synthetic_id if not exists for (n:" + SYNTHETIC_LABEL + ") on (n.synthetic_id)").consume()
+        session.run("call db.awaitIndexes()").consume()
+
+        for info in [False, True]:
+            rows = [{'id': n['id'], 'properties': {k: n[k] for k in ['name', 'type', 'text', 'source'] if n[k] is not None}}
+                    for n in graph.nodes if n['info'] == info]
+            _run_batches(session, """
+                         unwind $rows as row
+                         create (n:""" + SYNTHETIC_LABEL + (":Info" if info else "") + """ {synthetic_id: row.id})
+                         set n += row.properties
+                         """, rows)
+
+        by_type = {}
+        for r in graph.relationships:
+            by_type.setdefault(r['rel_type'], []).append(
+                {'start': r['start'], 'end': r['end'],
+                 'properties': {k: r[k] for k in ['name', 'text', 'source', 'type'] if r[k] is not None}})
+        for rel_type, rows in by_type.items():
+            _run_batches(session, """
+                         unwind $rows as row
+                         match (a:""" + SYNTHETIC_LABEL + """ {synthetic_id: row.start}), (b:""" + SYNTHETIC_LABEL + """ {synthetic_id: row.end})
+                         create (a)-[r:`""" + rel_type.replace('`', '``') + """`]->(b)
+                         set r += row.properties
+                         """, rows)
+    return len(graph.nodes), len(graph.relationships)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic Health KG, as JSON or into an empty Neo4j database")
+    parser.add_argument('command', choices=['generate', 'load'])
+    parser.add_argument('--scale', type=int, default=100, help="number of diseases; other node counts follow from it")
+    parser.add_argument('--answers', type=int, default=3, help="answers per entity and answer type")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='-', help="JSON output file for generate, or - for stdout")
+    args = parser.parse_args()
+
+    graph = generate(args.scale, args.answers, args.seed)
+    if args.command == 'generate':
+        out = sys.stdout if args.output == '-' else open(args.output, 'w')
+        try:
+            json.dump({'nodes': graph.nodes, 'relationships': graph.relationships}, out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    else:
+        driver = create_driver(load_config())
+        try:
+            node_count, relationship_count = load_into_neo4j(driver, graph)
+        finally:
+            driver.close()
+        print("Loaded", node_count, "nodes and", relationship_count, "relationships;",
+              "run kg_lookup.py backfill for normalized lookups and kg_cache.py bump to clear serving caches")
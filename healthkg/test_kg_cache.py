@@ -0,0 +1,35 @@
+from kg_cache import ResultCache
+
+
+def test_get_or_load_caches():
+    cache = ResultCache(max_size=2)
+    assert cache.get_or_load('a', lambda: 1) == 1
+    assert cache.get_or_load('a', lambda: 2) == 1
+    cache.get_or_load('b', lambda: 3)
+    cache.get_or_load('c', lambda: 4)
+    assert cache.get_or_load('a', lambda: 5) == 5
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 4, 2)
+
+
+def test_version_change_clears_the_cache():
+    cache = ResultCache(version_check_interval=0)
+    assert cache.check_version(lambda: 1)
+    cache.get_or_load('a', lambda: 'old')
+    assert not cache.check_version(lambda: 1)
+    assert cache.check_version(lambda: 2)
+    assert cache.get_or_load('a', lambda: 'new') == 'new'
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    cache = ResultCache(version_check_interval=0)
+    cache.check_version(lambda: 1)
+
+    def load():
+        # another session sees the re-ingest while this lookup still runs against the old graph
+        cache.check_version(lambda: 2)
+        return 'old'
+
+    assert cache.get_or_load('a', load) == 'old'
+    assert cache.get_or_load('a', lambda: 'new') == 'new'
+    assert cache.version == 2
@@ -0,0 +1,28 @@
+from kg_frames import batch_frame, lookup_tables, source_tables, to_frame
+
+INFO_BATCH = {
+    'Diabetes': [{'Lookup': 'Diabetes', 'Info': 'Eat well.', 'Source': 'MOH', 'Name': 'Diabetes', 'Type': 'Diet'},
+                 {'Lookup': 'Diabetes', 'Info': 'Walk daily.', 'Source': 'HPB', 'Name': 'Diabetes', 'Type': 'Exercise'},
+                 {'Lookup': 'Diabetes', 'Info': 'Join a group.', 'Source': 'MOH', 'Name': 'Diabetes', 'Type': 'Support Group'}],
+    'Obesity': [{'Lookup': 'Obesity', 'Info': 'Sleep well.', 'Source': None, 'Name': 'Obesity', 'Type': 'Diet'}],
+    '42': [{'Lookup': '42', 'Info': 'A number.', 'Source': 'MOH', 'Name': '42', 'Type': None}],
+}
+
+
+def test_batch_frame_keeps_the_lookup_column():
+    frame = batch_frame(INFO_BATCH, 'info')
+    assert list(frame.columns) == ['Lookup', 'Info', 'Source', 'Name', 'Type']
+    assert list(frame['Lookup']) == ['Diabetes', 'Diabetes', 'Diabetes', 'Obesity', '42']
+    assert batch_frame({}, 'definition').empty
+
+
+def test_lookup_tables_match_per_item_source_tables():
+    tables = lookup_tables(batch_frame(INFO_BATCH, 'info'), ['Name', 'Type'])
+    # rows without a source are dropped, as groupby('Source') drops them
+    assert 'Obesity' not in tables
+    for name, rows in INFO_BATCH.items():
+        expected = source_tables(to_frame(rows, 'info'), ['Name', 'Type'])
+        actual = tables.get(name, [])
+        assert [source for source, _ in actual] == [source for source, _ in expected]
+        for (_, table), (_, expected_table) in zip(actual, expected):
+            assert table.reset_index(drop=True).equals(expected_table.reset_index(drop=True))
@@ -0,0 +1,119 @@
+import pytest
+
+from kg_queries import ANSWER_COLUMN
+from kg_snapshot import GraphSnapshot, SnapshotService
+from kg_snapshot_file import MappedSnapshot, write_snapshot
+
+NODES = [
+    {'id': 10, 'name': 'Diabetes', 'type': 'Disease', 'text': 'A chronic disease.', 'source': 'MOH'},
+    {'id': 11, 'name': 'Metformin', 'type': 'Medication', 'text': 'A biguanide.', 'source': 'HPB'},
+    {'id': 12, 'name': 'Insulin', 'type': 'Medication', 'text': 'A hormone.', 'source': 'MOH'},
+    {'id': 13, 'name': 'Obesity', 'type': 'Condition', 'text': None, 'source': 'MOH'},
+    {'id': 14, 'name': 'Mystery', 'type': None, 'text': 'No type.', 'source': 'MOH'},
+    {'id': 15, 'name': 'Prescription', 'type': 'Prescription', 'text': None, 'source': None},
+    {'id': 16, 'name': 'Metformin', 'type': 'Effect', 'text': None, 'source': None},
+    {'id': 17, 'name': 'Nausea', 'type': 'Symptom', 'text': None, 'source': None},
+    {'id': 18, 'name': 'Rash', 'type': 'Symptom', 'text': None, 'source': None},
+    {'id': 19, 'name': 'Diet', 'type': 'Info', 'text': None, 'source': None, 'info': True},
+    {'id': 20, 'name': 'Insulin', 'type': 'Effect', 'text': None, 'source': None},
+]
+
+RELATIONSHIPS = [
+    {'start': 10, 'end': 11, 'rel_type': 'related_to'},
+    {'start': 13, 'end': 10, 'rel_type': 'related_to'},
+    {'start': 10, 'end': 14, 'rel_type': 'related_to'},
+    {'start': 15, 'end': 11, 'rel_type': 'prescription', 'name': 'Diabetes', 'source': 'MOH', 'text': None},
+    {'start': 15, 'end': 12, 'rel_type': 'prescription', 'name': 'Diabetes', 'source': 'HPB', 'text': 'With meals.'},
+    {'start': 15, 'end': 10, 'rel_type': 'prescription', 'name': 'Diabetes', 'source': 'MOH', 'text': None},
+    {'start': 11, 'end': 16, 'rel_type': 'has_effect'},
+    {'start': 16, 'end': 17, 'rel_type': 'effect', 'name': 'Biguanide', 'source': 'MOH', 'text': None},
+    {'start': 16, 'end': 18, 'rel_type': 'effect', 'name': 'Biguanide', 'source': 'HPB', 'text': 'Rare.'},
+    {'start': 12, 'end': 20, 'rel_type': 'has_effect'},
+    {'start': 19, 'end': 10, 'rel_type': 'info', 'name': 'Diabetes', 'source': 'MOH', 'text': 'Eat well.', 'type': 'Diet'},
+    {'start': 13, 'end': 14, 'rel_type': 'info', 'name': 'Diabetes', 'source': 'MOH', 'text': 'Not info.', 'type': 'Diet'},
+]
+
+
+def by_answer(rows):
+    return sorted(rows, key=lambda row: str(row.get(ANSWER_COLUMN, row.get('Most_Similar'))))
+
+
+@pytest.fixture(scope='module')
+def graph():
+    return GraphSnapshot.build(NODES, RELATIONSHIPS)
+
+
+@pytest.fixture(scope='module')
+def mapped(graph, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('snapshot') / 'fixture.snap')
+    write_snapshot(graph, path, graph_version=7)
+    snapshot = MappedSnapshot(path, verify=True)
+    assert snapshot.graph_version == 7
+    return snapshot
+
+
+@pytest.fixture(scope='module', params=['built', 'mapped'])
+def service(request, graph):
+    return SnapshotService(graph if request.param == 'built' else request.getfixturevalue('mapped'))
+
+
+@pytest.mark.parametrize('name', ['Diabetes', 'diabetes', '  DIABETES ', 'Diabetes\t'])
+def test_similar(service, name):
+    assert by_answer(service._similar(name)) == [
+        {'Most_Similar': 'Metformin', 'Name': 'Diabetes'},
+        {'Most_Similar': 'Mystery', 'Name': 'Diabetes'},
+        {'Most_Similar': 'Obesity', 'Name': 'Diabetes'},
+    ]
+
+
+def test_similar_skips_nodes_without_text(service):
+    assert service._similar('Obesity') == []
+    assert service._similar('') is None
+
+
+def test_definition(service):
+    assert service._definition('diabetes') == [{'Definition': 'A chronic disease.', 'Source': 'MOH', 'Name': 'Diabetes'}]
+    assert service._definition('Obesity') == []
+    # a node without a type is never a definition
+    assert service._definition('Mystery') == []
+
+
+def test_primary_answer(service):
+    assert by_answer(service._primary_answer('Diabetes  ', 'prescription')) == [
+        {ANSWER_COLUMN: 'Insulin', 'Source': 'HPB', 'Notes': 'With meals.', 'Name': 'Diabetes'},
+        {ANSWER_COLUMN: 'Metformin', 'Source': 'MOH', 'Notes': None, 'Name': 'Diabetes'},
+    ]
+
+
+def test_primary_answer_unknown_type(service):
+    assert service._primary_answer('Diabetes', 'xyzzy') is None
+    assert service._primary_answer('Prescription', 'prescription') is None
+
+
+def test_secondary_answer(service):
+    assert by_answer(service._secondary_answer('METFORMIN', 'effect', 'medication')) == [
+        {'Type': 'Biguanide', ANSWER_COLUMN: 'Nausea', 'Source': 'MOH', 'Notes': None},
+        {'Type': 'Biguanide', ANSWER_COLUMN: 'Rash', 'Source': 'HPB', 'Notes': 'Rare.'},
+    ]
+
+
+def test_secondary_answer_needs_two_relationships(service):
+    # Insulin's effect node has only the relationship to the medication; r1 cannot also serve as r2
+    assert service._secondary_answer('Insulin', 'effect', 'medication') == []
+    assert service._secondary_answer('Metformin', 'effect', 'xyzzy') is None
+
+
+def test_info(service):
+    assert service._info(' diabetes') == [{'Info': 'Eat well.', 'Source': 'MOH', 'Name': 'Diabetes', 'Type': 'Diet'}]
+    assert service._info('Metformin') == []
+
+
+def test_mapped_snapshot_matches_built(graph, mapped):
+    built, mapped = SnapshotService(graph), SnapshotService(mapped)
+    assert built.type_whitelist == mapped.type_whitelist
+    for name in ['Diabetes', 'metformin', 'Insulin', 'Obesity', 'Mystery', 'Nobody']:
+        assert built._similar(name) == mapped._similar(name)
+        assert built._definition(name) == mapped._definition(name)
+        assert built._info(name) == mapped._info(name)
+        assert built._primary_answer(name, 'prescription') == mapped._primary_answer(name, 'prescription')
+        assert built._secondary_answer(name, 'effect', 'medication') == mapped._secondary_answer(name, 'effect', 'medication')